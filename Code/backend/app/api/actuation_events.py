@@ -1,7 +1,10 @@
-from fastapi import APIRouter, status, HTTPException, Query
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request, Response
 from typing import Optional
 from app.models.actuation_event import ActuationEventPayload
 from app.repositories.actuation_events_repo import ActuationRepo
+from app.utils.validators import ingest_batch
+from app.utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, parse_fields
+from app.utils.wire import wire_body, wire_openapi
 
 router = APIRouter(prefix="/actuation_events", tags=["actuation_events"])
 
@@ -10,9 +13,13 @@ repo = ActuationRepo()
 
 @router.post(
     "/insert",
-    status_code=status.HTTP_201_CREATED
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=wire_openapi(ActuationEventPayload)
 )
-async def submit_actuation_event(payload: ActuationEventPayload):
+async def submit_actuation_event(
+    payload: ActuationEventPayload = Depends(wire_body(ActuationEventPayload, "actuation"))
+):
+    """Body: ActuationEventPayload as JSON, or msgpack (Content-Type: application/msgpack)."""
     await repo.insert_actuation_event(payload)
     return {
         "status": "ok",
@@ -20,12 +27,30 @@ async def submit_actuation_event(payload: ActuationEventPayload):
     }
 
 
+@router.post("/insert_batch", status_code=status.HTTP_201_CREATED)
+async def submit_actuation_event_batch(request: Request):
+    """
+    Body: JSON array of ActuationEventPayload, NDJSON (Content-Type: application/x-ndjson)
+    or a msgpack array (Content-Type: application/msgpack), optionally gzip'd.
+    Each item gets its own result: ok / invalid (don't retry) / failed (retry).
+    """
+    return await ingest_batch(
+        request,
+        ActuationEventPayload,
+        repo.insert_actuation_event_batch,
+        kind="actuation",
+        error_detail="Failed to store actuation events"
+    )
+
+
 @router.get(
     "/latest",
     status_code=status.HTTP_200_OK
 )
-async def get_latest_actuation_event():
-    event = await repo.get_latest_actuation_event()
+async def get_latest_actuation_event(
+    vehicle_id: Optional[str] = Query(None, description="Filter by vehicle ID")
+):
+    event = await repo.get_latest_actuation_event(vehicle_id=vehicle_id)
 
     if not event:
         raise HTTPException(
@@ -41,6 +66,19 @@ async def get_latest_actuation_event():
     status_code=status.HTTP_200_OK
 )
 async def get_actuation_history(
-    limit: int = Query(10, description="Number of events to retrieve")
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE, description="Number of events to retrieve"),
+    vehicle_id: Optional[str] = Query(None, description="Filter by vehicle ID"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
 ):
-    return await repo.get_actuation_history(limit=limit)
+    events, next_cursor = await repo.get_actuation_history(
+        limit=limit,
+        vehicle_id=vehicle_id,
+        after=cursor,
+        projection=parse_fields(fields)
+    )
+
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return events
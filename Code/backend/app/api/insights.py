@@ -1,7 +1,8 @@
 from http.client import HTTPException
-from fastapi import APIRouter, status
+from fastapi import APIRouter, status, Request
 from app.models.insights import AIInsightPayload
 from app.repositories.insights_repo import InsightRepo
+from app.utils.validators import ingest_batch
 
 router = APIRouter(prefix="/insights", tags=["insights"])
 
@@ -19,6 +20,23 @@ async def submit_ai_insights(payload: AIInsightPayload):
     }
 
 
+@router.post(
+    "/post_insights_batch",
+    status_code=status.HTTP_201_CREATED
+)
+async def submit_ai_insights_batch(request: Request):
+    """
+    Body: JSON array (or NDJSON, optionally gzip'd) of AIInsightPayload.
+    Per-item status: ok / invalid / not_found (don't retry) / failed (retry).
+    """
+    return await ingest_batch(
+        request,
+        AIInsightPayload,
+        repo.insert_ai_insights_batch,
+        error_detail="Failed to store insights"
+    )
+
+
 @router.get(
     "/latest_ai_insight/{vehicle_id}",
     status_code=status.HTTP_200_OK
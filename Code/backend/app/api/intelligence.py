@@ -1,50 +1,275 @@
-from fastapi import status, APIRouter, Query, HTTPException
-from typing import Optional
+from fastapi import status, APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, Literal
 from app.repositories.intelligence_repo import IntelligenceRepo
-from app.models.intelligence import IntelligencePayload 
+from app.repositories.insights_repo import InsightRepo
+from app.repositories.rollup_repo import RollupRepo, GRANULARITIES
+from app.models.insights import AIInsightPayload
+from app.models.intelligence import (
+    IntelligencePayload,
+    LeaseRequest,
+    LeaseExtendRequest,
+    LeaseReleaseRequest,
+)
+from app.utils.validators import ingest_batch
+from app.utils.wire import wire_body, wire_openapi
+from app.services.cache_service import get_latest_state
+from app.services.export_service import ndjson_chunks, csv_chunks, gzip_chunks
+from app.utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, parse_fields
+from app.utils.time import choose_bucket_ms
 router = APIRouter(prefix="/intelligence", tags=["intelligence"])
 repo = IntelligenceRepo()
+insight_repo = InsightRepo()
+rollup_repo = RollupRepo()
+
+# numeric health-vector fields that can be downsampled
+DOWNSAMPLE_FIELDS = {
+    name for name, field in IntelligencePayload.model_fields.items()
+    if field.annotation in (int, float)
+}
+DEFAULT_DOWNSAMPLE_FIELDS = "vehicle_health_score,thermal_stress_index,mechanical_vibration_rms"
+MAX_DOWNSAMPLE_POINTS = 2000
+MAX_ROLLUP_BUCKETS = 2000
+
+# default CSV columns per export source
+EXPORT_COLUMNS = {
+    "edge_state": ["_id", *IntelligencePayload.model_fields, "ingested_at"],
+    "insights": [
+        "_id",
+        *(f for f in AIInsightPayload.model_fields if f != "source_id"),
+        "source_ref",
+        "created_at"
+    ],
+}
 
 
 
 @router.get("/data/unprocessed")
 async def get_unprocessed_vehicle_data(
+    response: Response,
     vehicle_id: Optional[str] = Query(None, description="Filter by vehicle ID"),
-    limit: int = Query(10, description="Number of records to retrieve"),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE, description="Number of records to retrieve"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
 ):
+    projection = parse_fields(fields)
     try:
-        return await repo.get_unprocessed_vehicle_data(
+        records, next_cursor = await repo.get_unprocessed_vehicle_data(
             vehicle_id=vehicle_id,
-            limit=limit
+            limit=limit,
+            after=cursor,
+            projection=projection
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch unprocessed vehicle data: {str(e)}"
         )
 
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return records
+
 
 @router.get("/data/all")
 async def get_all_vehicle_data(
+    response: Response,
     vehicle_id: Optional[str] = Query(None, description="Filter by vehicle ID"),
-    limit: int = Query(10, description="Number of records to retrieve"),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE, description="Number of records to retrieve"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
 ):
+    projection = parse_fields(fields)
     try:
-        return await repo.get_all_vehicle_data(
+        records, next_cursor = await repo.get_all_vehicle_data(
             vehicle_id=vehicle_id,
-            limit=limit
+            limit=limit,
+            after=cursor,
+            projection=projection
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch vehicle data: {str(e)}"
         )
 
-@router.post("/insert", status_code=status.HTTP_201_CREATED)
-async def ingest_vehicle_data(payload: IntelligencePayload):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return records
+
+@router.get("/data/latest/{vehicle_id}")
+async def get_latest_vehicle_state(vehicle_id: str):
+    """Newest intelligence / insight / actuation record for a vehicle, served from the latest-state cache."""
+    state = await get_latest_state(vehicle_id)
+
+    if not state:
+        raise HTTPException(
+            status_code=404,
+            detail="No state recorded for this vehicle"
+        )
+
+    return state
+
+@router.post(
+    "/insert",
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=wire_openapi(IntelligencePayload)
+)
+async def ingest_vehicle_data(
+    payload: IntelligencePayload = Depends(wire_body(IntelligencePayload, "intelligence"))
+):
+    """Body: IntelligencePayload as JSON, or msgpack (Content-Type: application/msgpack)."""
     try:
         inserted_id = await repo.insert_vehicle_data(payload)
         return {"inserted_id": str(inserted_id)}
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to store vehicle data")
-    
\ No newline at end of file
+
+
+@router.post("/insert_batch", status_code=status.HTTP_201_CREATED)
+async def ingest_vehicle_data_batch(request: Request):
+    """
+    Body: JSON array of IntelligencePayload, NDJSON (Content-Type: application/x-ndjson)
+    or a msgpack array (Content-Type: application/msgpack), optionally gzip'd.
+    Each item gets its own result: ok / invalid (don't retry) / failed (retry).
+    """
+    return await ingest_batch(
+        request,
+        IntelligencePayload,
+        repo.insert_vehicle_data_batch,
+        kind="intelligence",
+        error_detail="Failed to store vehicle data"
+    )
+
+
+@router.post("/lease")
+async def lease_unprocessed_vehicle_data(payload: LeaseRequest):
+    """
+    Claim a batch of unprocessed records for one AI worker. Claimed records
+    are invisible to other workers until `lease_until`; if the worker neither
+    posts insights nor extends the lease by then, they are handed out again.
+    """
+    lease_until, records = await repo.lease_unprocessed(
+        worker_id=payload.worker_id,
+        limit=payload.limit,
+        lease_seconds=payload.lease_seconds,
+        vehicle_id=payload.vehicle_id
+    )
+    return {"lease_until": lease_until, "records": records}
+
+
+@router.post("/lease/extend")
+async def extend_vehicle_data_lease(payload: LeaseExtendRequest):
+    lease_until, extended = await repo.extend_lease(
+        worker_id=payload.worker_id,
+        ids=payload.ids,
+        lease_seconds=payload.lease_seconds
+    )
+    return {"lease_until": lease_until, "extended": extended}
+
+
+@router.post("/lease/release")
+async def release_vehicle_data_lease(payload: LeaseReleaseRequest):
+    released = await repo.release_lease(
+        worker_id=payload.worker_id,
+        ids=payload.ids
+    )
+    return {"released": released}
+
+
+@router.get("/export/{vehicle_id}")
+async def export_vehicle_data(
+    vehicle_id: str,
+    source: Literal["edge_state", "insights"] = Query("edge_state", description="Collection to export"),
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    start_ms: Optional[int] = Query(None, description="Inclusive lower bound on timestamp_ms"),
+    end_ms: Optional[int] = Query(None, description="Exclusive upper bound on timestamp_ms"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to export"),
+    gzip: bool = Query(False, description="Return a .gz file"),
+    batch_size: int = Query(1000, ge=1, le=10000, description="Documents per cursor round-trip"),
+):
+    """
+    Streams the whole range straight from the Mongo cursor, oldest first,
+    so memory stays flat however many records are exported.
+    """
+    projection = parse_fields(fields)
+    iterate = repo.iter_vehicle_data if source == "edge_state" else insight_repo.iter_insights
+    docs = iterate(vehicle_id, start_ms, end_ms, projection, batch_size)
+
+    if format == "csv":
+        columns = ["_id", *projection] if projection else EXPORT_COLUMNS[source]
+        body = csv_chunks(docs, columns)
+        media_type = "text/csv"
+    else:
+        body = ndjson_chunks(docs)
+        media_type = "application/x-ndjson"
+
+    filename = f"{vehicle_id}_{source}.{format}"
+    if gzip:
+        body = gzip_chunks(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/downsample/{vehicle_id}")
+async def downsample_vehicle_data(
+    vehicle_id: str,
+    start_ms: int = Query(..., description="Inclusive range start (epoch ms)"),
+    end_ms: int = Query(..., description="Exclusive range end (epoch ms)"),
+    fields: str = Query(DEFAULT_DOWNSAMPLE_FIELDS, description="Comma-separated numeric fields"),
+    points: int = Query(300, ge=1, le=MAX_DOWNSAMPLE_POINTS, description="Maximum number of buckets"),
+):
+    """
+    Chart-ready series: min / mean / max per time bucket. The bucket size is
+    picked from the range so at most `points` buckets come back.
+    """
+    if end_ms <= start_ms:
+        raise HTTPException(status_code=400, detail="end_ms must be after start_ms")
+
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in DOWNSAMPLE_FIELDS]
+    if not selected or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown or non-numeric fields: {', '.join(unknown) or fields}"
+        )
+
+    bucket_ms = choose_bucket_ms(end_ms - start_ms, points)
+
+    return {
+        "vehicle_id": vehicle_id,
+        "bucket_ms": bucket_ms,
+        "points": await repo.downsample(vehicle_id, start_ms, end_ms, bucket_ms, selected)
+    }
+
+
+@router.get("/rollups")
+async def get_vehicle_rollups(
+    granularity: Literal["1m", "1h"] = Query("1h"),
+    start_ms: int = Query(..., description="Inclusive range start (epoch ms)"),
+    end_ms: int = Query(..., description="Exclusive range end (epoch ms)"),
+    vehicle_id: Optional[str] = Query(None, description="Omit for fleet-wide rollups"),
+):
+    """Pre-aggregated count / sum / min / max / mean of the health vector per minute or hour."""
+    if end_ms <= start_ms:
+        raise HTTPException(status_code=400, detail="end_ms must be after start_ms")
+
+    bucket_ms, _ = GRANULARITIES[granularity]
+    if (end_ms - start_ms) / bucket_ms > MAX_ROLLUP_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range spans more than {MAX_ROLLUP_BUCKETS} {granularity} buckets"
+        )
+
+    return await rollup_repo.get_rollups(granularity, start_ms, end_ms, vehicle_id)
+
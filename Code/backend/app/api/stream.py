@@ -0,0 +1,66 @@
+import asyncio
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.utils.auth.auth import get_current_user
+from app.utils.auth.user_service import ensure_user_exists
+from app.core.db import ownership_collection
+from app.services.pubsub import vehicle_hub
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+HEARTBEAT_SEC = 15
+MAX_VEHICLES_PER_STREAM = 100
+
+
+async def _event_stream(request: Request, sub):
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(sub.queue.get(), HEARTBEAT_SEC)
+            except asyncio.TimeoutError:
+                frame = ": keep-alive\n\n"
+
+            if frame is None or await request.is_disconnected():
+                break
+            yield frame
+    finally:
+        vehicle_hub.unsubscribe(sub)
+
+
+@router.get("/vehicles")
+async def stream_vehicle_updates(
+    request: Request,
+    vehicle_id: List[str] = Query(..., description="Vehicle IDs to subscribe to (repeatable)"),
+    user=Depends(get_current_user)
+):
+    """
+    Server-Sent Events: pushes `intelligence`, `insight` and `actuation`
+    events for the given vehicles as the ingest endpoints accept them.
+    """
+    uid = await ensure_user_exists(user)
+
+    vehicle_ids = set(vehicle_id)
+    if len(vehicle_ids) > MAX_VEHICLES_PER_STREAM:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_VEHICLES_PER_STREAM} vehicles per stream"
+        )
+
+    # ownership is checked once here, not per event
+    owned = await ownership_collection.count_documents({
+        "user_id": uid,
+        "vehicle_id": {"$in": list(vehicle_ids)}
+    })
+
+    if owned != len(vehicle_ids):
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    sub = vehicle_hub.subscribe(vehicle_ids)
+
+    return StreamingResponse(
+        _event_stream(request, sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
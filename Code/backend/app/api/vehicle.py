@@ -17,6 +17,29 @@ def generate_activation_code(length: int = 6):
     return ''.join(random.choices(string.digits, k=length))
 
 
+def my_vehicles_pipeline(uid: str) -> list[dict]:
+    # ownerships joined to their vehicles in one round-trip (served by
+    # ownership.user_vehicle and the unique vehicles.vehicle_id index)
+    return [
+        {"$match": {"user_id": uid}},
+        {"$lookup": {
+            "from": vehicles_collection.name,
+            "localField": "vehicle_id",
+            "foreignField": "vehicle_id",
+            "as": "vehicle"
+        }},
+        {"$unwind": "$vehicle"},
+        {"$project": {
+            "_id": 0,
+            "vehicle_id": "$vehicle.vehicle_id",
+            "vin": {"$ifNull": ["$vehicle.vin", None]},
+            "dealership_name": "$vehicle.dealership_name",
+            "activation_status": "$vehicle.activation_status",
+            "claimed_at": 1
+        }}
+    ]
+
+
 
 
 
@@ -102,25 +125,10 @@ async def get_my_vehicles(
 
     uid = await ensure_user_exists(user)
 
-    ownerships = ownership_collection.find({"user_id": uid})
-
-    vehicles = []
-
-    async for record in ownerships:
-        vehicle = await vehicles_collection.find_one(
-            {"vehicle_id": record["vehicle_id"]}
-        )
-
-        if vehicle:
-            vehicles.append(
-                VehicleSummary(
-                    vehicle_id=vehicle["vehicle_id"],
-                    vin=vehicle.get("vin"),
-                    dealership_name=vehicle["dealership_name"],
-                    activation_status=vehicle["activation_status"],
-                    claimed_at=record["claimed_at"]
-                )
-            )
+    vehicles = [
+        VehicleSummary(**record)
+        async for record in ownership_collection.aggregate(my_vehicles_pipeline(uid))
+    ]
 
     return MyVehiclesResponse(vehicles=vehicles)
 
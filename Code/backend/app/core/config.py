@@ -8,6 +8,35 @@ class Settings(BaseSettings):
     MONGO_DB_NAME: str
     ADMIN_SECRET_KEY: str
     FIREBASE: str
+
+    # /insert_batch bodies: max bytes read off the wire, and again after gunzip (413 beyond either)
+    MAX_BATCH_BYTES: int = 8 * 1024 * 1024
+
+    # write-behind ingest buffer: flush at this many documents or after this many ms
+    INGEST_BATCH_MAX: int = 500
+    INGEST_FLUSH_MS: int = 20
+
+    # in-process latest-state cache (per vehicle)
+    LATEST_STATE_CACHE_SIZE: int = 10000
+    LATEST_STATE_TTL_SEC: int = 60
+
+    # realtime stream: per-subscriber queue size, drops in a row before a slow subscriber is cut
+    STREAM_QUEUE_SIZE: int = 100
+    STREAM_MAX_DROPS: int = 50
+
+    # opt-in time-series storage for vehicle_edge_state / actuation_events (MongoDB 7.0+),
+    # retention in days (0 keeps everything). Existing collections: app.core.timeseries_migration
+    TIMESERIES_STORAGE: bool = False
+    EDGE_STATE_RETENTION_DAYS: int = 0
+    ACTUATION_RETENTION_DAYS: int = 0
+
+    # decoded Firebase ID tokens kept until their exp; threads for blocking verification
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_VERIFY_WORKERS: int = 4
+
+    # uids known to have a users document (skips the per-request users lookup), rechecked after the TTL
+    KNOWN_USERS_CACHE_SIZE: int = 10000
+    KNOWN_USERS_TTL_SEC: int = 3600
     class Config:
         env_file = ".env"
 
@@ -1,4 +1,6 @@
 
+from datetime import datetime, timezone
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.server_api import ServerApi
 from app.core.config import settings
@@ -16,6 +18,8 @@ actuation_events = db["actuation_events"]
 users = db["users"]
 vehicles = db["vehicles"]
 ownership_collection = db["vehicle_ownership"]
+vehicle_rollups_1m = db["vehicle_rollups_1m"] # per-vehicle per-minute health vector rollups
+vehicle_rollups_1h = db["vehicle_rollups_1h"] # per-vehicle per-hour health vector rollups
 
 
 async def ping_server():
@@ -24,4 +28,81 @@ async def ping_server():
         server.logger.info("You successfully connected to MongoDB!")
     except Exception as e:
         print(e)
-      
\ No newline at end of file
+
+
+# Time-series storage (settings.TIMESERIES_STORAGE). Queries keep using the integer
+# timestamp_ms; recorded_at is the same instant as a BSON date, which Mongo requires
+# for the timeField and the TTL.
+TIME_FIELD = "recorded_at"
+META_FIELD = "vehicle_id"
+
+# collection -> retention in days (0 = keep forever)
+TIMESERIES_COLLECTIONS = {
+    vehicle_edge_state: settings.EDGE_STATE_RETENTION_DAYS,
+    actuation_events: settings.ACTUATION_RETENTION_DAYS,
+}
+
+
+def with_time_field(document: dict) -> dict:
+    """Adds the timeField in time-series mode; documents are unchanged otherwise."""
+    if settings.TIMESERIES_STORAGE:
+        document[TIME_FIELD] = datetime.fromtimestamp(document["timestamp_ms"] / 1000, tz=timezone.utc)
+    return document
+
+
+def with_packet_id(document: dict) -> dict:
+    """
+    The fog's packet_id becomes the _id, so replaying a packet after a lost
+    response hits a duplicate key instead of storing it twice. Time-series
+    collections don't enforce a unique _id; there replays are not caught.
+    """
+    packet_id = document.pop("packet_id", None)
+    if packet_id:
+        document["_id"] = ObjectId(packet_id)
+    return document
+
+
+async def _collection_info(name: str):
+    async for info in db.list_collections(filter={"name": name}):
+        return info
+    return None
+
+
+async def create_timeseries(name: str, retention_days: int):
+    options = {}
+    if retention_days:
+        options["expireAfterSeconds"] = retention_days * 86400
+
+    await db.create_collection(
+        name,
+        timeseries={"timeField": TIME_FIELD, "metaField": META_FIELD, "granularity": "seconds"},
+        **options
+    )
+
+
+async def ensure_collections():
+    """
+    In time-series mode: create missing collections as time-series and keep their
+    TTL in line with the configured retention. Plain collections are left alone
+    (see app.core.timeseries_migration).
+    """
+    if not settings.TIMESERIES_STORAGE:
+        return
+
+    for collection, retention_days in TIMESERIES_COLLECTIONS.items():
+        info = await _collection_info(collection.name)
+
+        if info is None:
+            await create_timeseries(collection.name, retention_days)
+            server.logger.info(f"Created time-series collection {collection.name}")
+        elif info.get("type") != "timeseries":
+            server.logger.warning(
+                f"{collection.name} is a plain collection; run python -m app.core.timeseries_migration"
+            )
+        elif info["options"].get("expireAfterSeconds") != (retention_days * 86400 or None):
+            await db.command(
+                "collMod",
+                collection.name,
+                expireAfterSeconds=retention_days * 86400 or "off"
+            )
+
@@ -0,0 +1,166 @@
+import asyncio
+import sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from uvicorn import server
+from app.core.db import (
+    vehicle_edge_state,
+    vehicle_ai_insights,
+    vehicle_latest_state_collection,
+    actuation_events,
+    vehicles,
+    ownership_collection,
+    vehicle_rollups_1m,
+    vehicle_rollups_1h,
+)
+
+
+# Every index the repositories rely on. Applied idempotently at startup:
+# create_indexes is a no-op for indexes that already exist with the same spec.
+# History queries page on (timestamp_ms, _id), so those indexes end in _id.
+INDEXES = {
+    vehicle_edge_state: [
+        IndexModel(
+            [("vehicle_id", ASCENDING), ("timestamp_ms", DESCENDING), ("_id", DESCENDING)],
+            name="vehicle_ts_id"
+        ),
+        IndexModel([("timestamp_ms", DESCENDING), ("_id", DESCENDING)], name="ts_id"),
+        # partial indexes only hold ai_processed: False, so they stay small however large the
+        # collection grows. Ascending keys keep the key patterns distinct from the full indexes
+        # above; a B-tree is walked either way for the descending sort.
+        IndexModel(
+            [("timestamp_ms", ASCENDING), ("_id", ASCENDING)],
+            name="unprocessed_ts_id",
+            partialFilterExpression={"processing_meta.ai_processed": False}
+        ),
+        IndexModel(
+            [("vehicle_id", ASCENDING), ("timestamp_ms", ASCENDING), ("_id", ASCENDING)],
+            name="unprocessed_vehicle_ts_id",
+            partialFilterExpression={"processing_meta.ai_processed": False}
+        ),
+    ],
+    vehicle_ai_insights: [
+        IndexModel([("vehicle_id", ASCENDING), ("timestamp_ms", DESCENDING)], name="vehicle_ts"),
+    ],
+    actuation_events: [
+        IndexModel([("timestamp_ms", DESCENDING), ("_id", DESCENDING)], name="ts_id"),
+        IndexModel(
+            [("vehicle_id", ASCENDING), ("timestamp_ms", DESCENDING), ("_id", DESCENDING)],
+            name="vehicle_ts_id"
+        ),
+    ],
+    vehicle_latest_state_collection: [
+        # StateCacheRepo.upsert_section relies on this being unique
+        IndexModel([("vehicle_id", ASCENDING)], name="vehicle_id", unique=True),
+    ],
+    vehicles: [
+        IndexModel([("vehicle_id", ASCENDING)], name="vehicle_id", unique=True),
+    ],
+    ownership_collection: [
+        IndexModel([("user_id", ASCENDING), ("vehicle_id", ASCENDING)], name="user_vehicle"),
+        IndexModel([("vehicle_id", ASCENDING)], name="vehicle_id"),
+    ],
+    # rollups are upserted by _id; these serve per-vehicle and fleet-wide range reads
+    vehicle_rollups_1m: [
+        IndexModel([("vehicle_id", ASCENDING), ("bucket_start", ASCENDING)], name="vehicle_bucket"),
+        IndexModel([("bucket_start", ASCENDING)], name="bucket"),
+    ],
+    vehicle_rollups_1h: [
+        IndexModel([("vehicle_id", ASCENDING), ("bucket_start", ASCENDING)], name="vehicle_bucket"),
+        IndexModel([("bucket_start", ASCENDING)], name="bucket"),
+    ],
+}
+
+# Query shapes issued by the repositories / routers: (name, collection, filter, sort).
+# check_query_plans() explains each one and reports any that would scan the collection.
+_SAMPLE_ID = "__explain__"
+
+_PAGE_SORT = [("timestamp_ms", -1), ("_id", -1)]
+
+QUERY_SHAPES = [
+    ("edge_state.all", vehicle_edge_state, {}, _PAGE_SORT),
+    ("edge_state.by_vehicle", vehicle_edge_state, {"vehicle_id": _SAMPLE_ID}, _PAGE_SORT),
+    ("edge_state.unprocessed", vehicle_edge_state,
+     {"processing_meta.ai_processed": False}, _PAGE_SORT),
+    ("edge_state.unprocessed_by_vehicle", vehicle_edge_state,
+     {"processing_meta.ai_processed": False, "vehicle_id": _SAMPLE_ID}, _PAGE_SORT),
+    ("edge_state.lease_candidates", vehicle_edge_state,
+     {"processing_meta.ai_processed": False,
+      "$or": [{"processing_meta.lease_until": None}, {"processing_meta.lease_until": {"$lt": 0}}]},
+     [("timestamp_ms", 1)]),
+    ("edge_state.export", vehicle_edge_state,
+     {"vehicle_id": _SAMPLE_ID, "timestamp_ms": {"$gte": 0, "$lt": 1}}, [("timestamp_ms", 1), ("_id", 1)]),
+    ("insights.latest", vehicle_ai_insights, {"vehicle_id": _SAMPLE_ID}, [("timestamp_ms", -1)]),
+    ("insights.export", vehicle_ai_insights,
+     {"vehicle_id": _SAMPLE_ID, "timestamp_ms": {"$gte": 0, "$lt": 1}}, [("timestamp_ms", 1)]),
+    ("actuation_events.latest", actuation_events, {}, [("timestamp_ms", -1)]),
+    ("actuation_events.history", actuation_events, {}, _PAGE_SORT),
+    ("actuation_events.by_vehicle", actuation_events, {"vehicle_id": _SAMPLE_ID}, [("timestamp_ms", -1)]),
+    ("latest_state.by_vehicle", vehicle_latest_state_collection, {"vehicle_id": _SAMPLE_ID}, None),
+    ("rollups_1h.by_vehicle", vehicle_rollups_1h,
+     {"vehicle_id": _SAMPLE_ID, "bucket_start": {"$gte": 0, "$lt": 1}}, [("bucket_start", 1)]),
+    ("rollups_1h.fleet", vehicle_rollups_1h, {"bucket_start": {"$gte": 0, "$lt": 1}}, [("bucket_start", 1)]),
+    ("vehicles.by_id", vehicles, {"vehicle_id": _SAMPLE_ID}, None),
+    ("vehicles.claim", vehicles,
+     {"vehicle_id": _SAMPLE_ID, "activation_code": "000000", "activation_status": "unclaimed"}, None),
+    ("ownership.by_user", ownership_collection, {"user_id": _SAMPLE_ID}, None),
+    ("ownership.by_vehicle_user", ownership_collection,
+     {"vehicle_id": _SAMPLE_ID, "user_id": _SAMPLE_ID}, None),
+]
+
+# plan stages that mean "read everything" or "sort everything in memory"
+BAD_STAGES = {"COLLSCAN", "SORT"}
+
+
+async def ensure_indexes():
+    for collection, models in INDEXES.items():
+        try:
+            await collection.create_indexes(models)
+        except OperationFailure as e:
+            # e.g. an index with the same name but a different spec; don't block startup
+            server.logger.error(f"Index creation failed on {collection.name}: {e}")
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def check_query_plans() -> dict:
+    """Returns {query name: offending stages} for every shape whose winning plan scans or sorts in memory."""
+    failures = {}
+
+    for name, collection, query, sort in QUERY_SHAPES:
+        cursor = collection.find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+
+        explained = await cursor.explain()
+        stages = set(_plan_stages(explained["queryPlanner"]["winningPlan"]))
+
+        bad = stages & BAD_STAGES
+        if bad:
+            failures[name] = sorted(bad)
+
+    return failures
+
+
+async def _main():
+    await ensure_indexes()
+    failures = await check_query_plans()
+
+    for name, stages in failures.items():
+        print(f"FAIL {name}: {', '.join(stages)}")
+    if not failures:
+        print(f"OK: {len(QUERY_SHAPES)} query shapes use an index")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    # python -m app.core.indexes  -> apply indexes, explain every query shape
+    sys.exit(asyncio.run(_main()))
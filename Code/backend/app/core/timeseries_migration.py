@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import sys
+import time
+from app.core.config import settings
+from app.core.db import (
+    db,
+    TIME_FIELD,
+    TIMESERIES_COLLECTIONS,
+    _collection_info,
+    create_timeseries,
+)
+from app.core.indexes import ensure_indexes
+
+COPY_BATCH = 1000
+
+
+async def migrate(collection, retention_days: int, drop_legacy: bool):
+    """
+    <name> -> <name>_legacy, then a new time-series <name> filled from it.
+    _ids are kept, so cursors and source_ref links stay valid. Documents already
+    past retention are not copied. Stop the API while this runs.
+    """
+    name = collection.name
+    legacy_name = f"{name}_legacy"
+
+    info = await _collection_info(name)
+    if info is not None and info.get("type") == "timeseries":
+        print(f"{name}: already time-series, skipping")
+        return
+    if await _collection_info(legacy_name) is not None:
+        raise RuntimeError(f"{legacy_name} already exists; drop it or finish the previous migration by hand")
+
+    if info is not None:
+        await collection.rename(legacy_name)
+    await create_timeseries(name, retention_days)
+
+    query = {}
+    if retention_days:
+        query["timestamp_ms"] = {"$gte": int(time.time() * 1000) - retention_days * 86400 * 1000}
+
+    pipeline = [
+        {"$match": query},
+        {"$addFields": {TIME_FIELD: {"$toDate": "$timestamp_ms"}}},
+    ]
+
+    copied = 0
+    batch = []
+    async for doc in db[legacy_name].aggregate(pipeline, batchSize=COPY_BATCH):
+        batch.append(doc)
+        if len(batch) >= COPY_BATCH:
+            await collection.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    print(f"{name}: copied {copied} documents into time-series collection")
+
+    if drop_legacy:
+        await db[legacy_name].drop()
+        print(f"{name}: dropped {legacy_name}")
+    else:
+        print(f"{name}: original data kept in {legacy_name}")
+
+
+async def _main(args):
+    if not settings.TIMESERIES_STORAGE:
+        print("Set TIMESERIES_STORAGE=true first, or the API will keep writing plain documents")
+        return 1
+
+    for collection, retention_days in TIMESERIES_COLLECTIONS.items():
+        await migrate(collection, retention_days, args.drop_legacy)
+
+    # secondary indexes do not survive the move
+    await ensure_indexes()
+    return 0
+
+
+if __name__ == "__main__":
+    # python -m app.core.timeseries_migration [--drop-legacy]
+    parser = argparse.ArgumentParser(
+        description="Convert vehicle_edge_state / actuation_events to time-series collections"
+    )
+    parser.add_argument("--drop-legacy", action="store_true", help="drop <name>_legacy once copied")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -4,9 +4,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api import intelligence
 from app.api import insights
 from app.api import actuation_events
-from app.core.db import ping_server
+from app.core.db import ping_server, ensure_collections
+from app.core.indexes import ensure_indexes
+from app.services.write_behind import flush_all
 from app.api import vehicle
 from app.api import user
+from app.api import stream
 
 
 
@@ -20,6 +23,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(intelligence.router, prefix="/api")
@@ -27,7 +31,15 @@ app.include_router(insights.router, prefix="/api")
 app.include_router(actuation_events.router, prefix="/api")
 app.include_router(vehicle.router, prefix="/api")
 app.include_router(user.router, prefix='/api')
+app.include_router(stream.router, prefix="/api")
 
 @app.on_event("startup")
 async def startup_event():
-    await ping_server()
\ No newline at end of file
+    await ping_server()
+    await ensure_collections()
+    await ensure_indexes()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await flush_all()
\ No newline at end of file
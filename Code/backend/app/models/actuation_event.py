@@ -1,7 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional
 
 
 class ActuationEventPayload(BaseModel):
+    vehicle_id: Optional[str] = None
     timestamp_ms: int
     decision_origin: str
     cloud_dependency: bool
@@ -19,3 +21,7 @@ class ActuationEventPayload(BaseModel):
     fog_vibration_damping_mode_active: bool
     fog_predictive_service_required: bool
     fog_emergency_safeguard_active: bool
+
+    # set by the fog per packet and stored as _id, so a replayed packet is stored once;
+    # None from fog builds that predate it
+    packet_id: Optional[str] = Field(None, pattern=r"^[0-9a-f]{24}$")
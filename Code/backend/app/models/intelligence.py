@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 
 class IntelligencePayload(BaseModel):
@@ -34,4 +35,30 @@ class IntelligencePayload(BaseModel):
     fog_brake_stress_mitigation_active: bool
     fog_vibration_damping_mode_active: bool
     fog_predictive_service_required: bool
-    fog_emergency_safeguard_active: bool
\ No newline at end of file
+    fog_emergency_safeguard_active: bool
+
+    # why the fog sent this packet; None from fog builds that predate the uplink policy
+    send_reason: Optional[Literal["periodic", "change", "heartbeat", "actuation"]] = None
+
+    # set by the fog per packet and stored as _id, so a replayed packet is stored once;
+    # None from fog builds that predate it
+    packet_id: Optional[str] = Field(None, pattern=r"^[0-9a-f]{24}$")
+
+
+class LeaseRequest(BaseModel):
+    worker_id: str = Field(..., min_length=1, max_length=100)
+    limit: int = Field(10, ge=1, le=500)
+    lease_seconds: int = Field(60, ge=1, le=900)
+    vehicle_id: Optional[str] = None
+
+
+class LeaseExtendRequest(BaseModel):
+    worker_id: str = Field(..., min_length=1, max_length=100)
+    ids: List[str] = Field(..., max_length=500)
+    lease_seconds: int = Field(60, ge=1, le=900)
+
+
+class LeaseReleaseRequest(BaseModel):
+    worker_id: str = Field(..., min_length=1, max_length=100)
+    ids: List[str] = Field(..., max_length=500)
+
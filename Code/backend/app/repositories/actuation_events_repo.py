@@ -1,23 +1,58 @@
 import time
-from app.core.db import actuation_events
+from typing import List, Optional
+from app.core.db import actuation_events, with_time_field, with_packet_id
+from app.services.write_behind import actuation_writer, insert_batch
+from app.services.cache_service import record_latest_many, get_latest_section
+from app.services.pubsub import vehicle_hub
 from app.models.actuation_event import ActuationEventPayload
+from app.utils.pagination import PAGE_SORT, encode_cursor, cursor_filter
 
 
 class ActuationRepo:
 
     async def insert_actuation_event(self, payload: ActuationEventPayload):
-        document = {
+        document = with_packet_id(with_time_field({
             **payload.model_dump(),
             "ingested_at": int(time.time() * 1000)
-        }
+        }))
 
-        result = await actuation_events.insert_one(document)
-        return str(result.inserted_id)
+        # coalesced with concurrent inserts into one insert_many; the flush also updates the latest state
+        inserted_id = await actuation_writer.insert(document)
+
+        if payload.vehicle_id:
+            vehicle_hub.publish(payload.vehicle_id, "actuation", document)
+        return inserted_id
+
+    async def insert_actuation_event_batch(
+        self,
+        payloads: List[ActuationEventPayload]
+    ) -> list[dict]:
+        """Returns a result per payload, in order (see insert_batch)."""
+        now_ts = int(time.time() * 1000)
+        documents = [
+            with_packet_id(with_time_field({**p.model_dump(), "ingested_at": now_ts}))
+            for p in payloads
+        ]
+        stored, results = await insert_batch(actuation_events, documents)
+
+        for doc in stored:
+            if doc["vehicle_id"]:
+                vehicle_hub.publish(doc["vehicle_id"], "actuation", doc)
+        await record_latest_many("actuation", stored)
+
+        return results
+
+    async def get_latest_actuation_event(self, vehicle_id: Optional[str] = None):
+        query = {}
+        if vehicle_id:
+            cached = await get_latest_section(vehicle_id, "actuation")
+            if cached:
+                return cached
+            query["vehicle_id"] = vehicle_id
 
-    async def get_latest_actuation_event(self):
         document = await (
             actuation_events
-            .find({})
+            .find(query)
             .sort("timestamp_ms", -1)
             .limit(1)
             .to_list(length=1)
@@ -30,17 +65,34 @@ class ActuationRepo:
         doc["_id"] = str(doc["_id"])
         return doc
 
-    async def get_actuation_history(self, limit: int = 10):
+    async def get_actuation_history(
+        self,
+        limit: int = 10,
+        vehicle_id: Optional[str] = None,
+        after: Optional[str] = None,
+        projection: Optional[dict] = None
+    ) -> tuple[list[dict], Optional[str]]:
+        """One keyset page, newest first. Returns (page, cursor for the next page or None)."""
+        query = {}
+        if vehicle_id:
+            query["vehicle_id"] = vehicle_id
+        if after:
+            query = {"$and": [query, cursor_filter(after)]}
+
         cursor = (
             actuation_events
-            .find({})
-            .sort("timestamp_ms", -1)
+            .find(query, projection)
+            .sort(PAGE_SORT)
             .limit(limit)
         )
 
         results = []
         async for doc in cursor:
-            doc["_id"] = str(doc["_id"])
             results.append(doc)
 
-        return results
+        next_cursor = encode_cursor(results[-1]) if len(results) == limit else None
+
+        for doc in results:
+            doc["_id"] = str(doc["_id"])
+
+        return results, next_cursor
@@ -1,13 +1,25 @@
 import time
+from typing import List, Optional
 from bson import ObjectId
 from bson.errors import InvalidId
 from fastapi import HTTPException
 from app.core.db import vehicle_ai_insights, vehicle_edge_state
 from app.models.insights import AIInsightPayload
+from app.services.cache_service import record_latest, record_latest_many, get_latest_section
+from app.services.pubsub import vehicle_hub
+from app.services.write_behind import insert_batch
 
 
 class InsightRepo:
 
+    @staticmethod
+    def _processed_fields(now_ts: int) -> dict:
+        return {
+            "processing_meta.ai_processed": True,
+            "processing_meta.processed_at": now_ts,
+            "processing_meta.ai_version": "v1.0"
+        }
+
     async def insert_ai_insight(self, payload: AIInsightPayload):
 
         # 1️⃣ Validate ObjectId format
@@ -45,13 +57,7 @@ class InsightRepo:
         # 5️⃣ Mark raw data as processed
         update_result = await vehicle_edge_state.update_one(
             {"_id": source_object_id},
-            {
-                "$set": {
-                    "processing_meta.ai_processed": True,
-                    "processing_meta.processed_at": now_ts,
-                    "processing_meta.ai_version": "v1.0"
-                }
-            }
+            {"$set": self._processed_fields(now_ts)}
         )
 
         if update_result.matched_count == 0:
@@ -60,8 +66,82 @@ class InsightRepo:
                 detail="Failed to update vehicle_edge_state"
             )
 
+        await record_latest(payload.vehicle_id, "insight", insight_doc)
+        vehicle_hub.publish(payload.vehicle_id, "insight", insight_doc)
+
+
+    async def insert_ai_insights_batch(
+        self,
+        payloads: List[AIInsightPayload]
+    ) -> list[dict]:
+        """
+        Batch version of insert_ai_insight, three round-trips in total:
+        one $in lookup of every source_id, one insert_many of the insights,
+        one update_many marking the sources processed.
+        Returns a result per payload, in order.
+        """
+        results = [None] * len(payloads)
+        source_ids = {}
+
+        # 1️⃣ Validate ObjectId formats
+        for i, payload in enumerate(payloads):
+            try:
+                source_ids[i] = ObjectId(payload.source_id)
+            except (InvalidId, TypeError):
+                results[i] = {"status": "invalid", "detail": "Invalid source_id format"}
+
+        # 2️⃣ Check all sources exist in one query
+        found = set()
+        if source_ids:
+            cursor = vehicle_edge_state.find(
+                {"_id": {"$in": list(set(source_ids.values()))}},
+                {"_id": 1}
+            )
+            found = {doc["_id"] async for doc in cursor}
+
+        now_ts = int(time.time() * 1000)
+        pending = []
+
+        for i, oid in source_ids.items():
+            if oid not in found:
+                results[i] = {"status": "not_found", "detail": "source_id not found in vehicle_edge_state"}
+                continue
+
+            # 3️⃣ Prepare AI insight document
+            pending.append((i, {
+                **payloads[i].model_dump(exclude={"source_id"}),
+                "source_ref": oid,
+                "created_at": now_ts
+            }))
+
+        if not pending:
+            return results
+
+        # 4️⃣ Insert all insights
+        stored, inserted = await insert_batch(vehicle_ai_insights, [doc for _, doc in pending])
+        for (i, _), result in zip(pending, inserted):
+            results[i] = result
+
+        if not stored:
+            return results
+
+        # 5️⃣ Mark all their sources processed at once
+        await vehicle_edge_state.update_many(
+            {"_id": {"$in": [doc["source_ref"] for doc in stored]}},
+            {"$set": self._processed_fields(now_ts)}
+        )
+
+        for doc in stored:
+            vehicle_hub.publish(doc["vehicle_id"], "insight", doc)
+        await record_latest_many("insight", stored)
+
+        return results
 
     async def get_latest_insight(self, vehicle_id: str):
+        cached = await get_latest_section(vehicle_id, "insight")
+        if cached:
+            return cached
+
         document = await (
             vehicle_ai_insights
             .find({"vehicle_id": vehicle_id})
@@ -75,4 +155,32 @@ class InsightRepo:
 
         doc = document[0]
         doc["_id"] = str(doc["_id"])
-        return doc
\ No newline at end of file
+        return doc
+
+    async def iter_insights(
+        self,
+        vehicle_id: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        projection: Optional[dict] = None,
+        batch_size: int = 1000
+    ):
+        """Stream a vehicle's insights oldest first straight off the cursor, `batch_size` per round-trip."""
+        query = {"vehicle_id": vehicle_id}
+        if start_ms is not None or end_ms is not None:
+            query["timestamp_ms"] = {}
+            if start_ms is not None:
+                query["timestamp_ms"]["$gte"] = start_ms
+            if end_ms is not None:
+                query["timestamp_ms"]["$lt"] = end_ms
+
+        cursor = (
+            vehicle_ai_insights
+            .find(query, projection)
+            .sort("timestamp_ms", 1)
+            .batch_size(batch_size)
+        )
+
+        async for doc in cursor:
+            yield doc
+
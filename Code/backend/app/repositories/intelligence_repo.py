@@ -1,35 +1,60 @@
-from app.core.db import vehicle_edge_state
+from uvicorn import server
+from app.core.db import vehicle_edge_state, with_time_field, with_packet_id
+from app.services.write_behind import edge_state_writer, insert_batch
+from app.services.cache_service import record_latest_many
+from app.services.pubsub import vehicle_hub
+from app.repositories.rollup_repo import RollupRepo
 from app.models.intelligence import IntelligencePayload
+from app.utils.pagination import PAGE_SORT, encode_cursor, cursor_filter
+from app.utils.time import bucket_start_expr
 from typing import List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
 import time
+import uuid
+
+rollup_repo = RollupRepo()
+
 
 class IntelligenceRepo:
 
     async def _fetch(
         self,
         query: dict,
-        limit: int
-    ) -> list[dict]:
+        limit: int,
+        after: Optional[str] = None,
+        projection: Optional[dict] = None
+    ) -> tuple[list[dict], Optional[str]]:
+        """One keyset page, newest first. Returns (page, cursor for the next page or None)."""
+
+        if after:
+            query = {"$and": [query, cursor_filter(after)]}
 
         cursor = (
             vehicle_edge_state
-            .find(query)
-            .sort("timestamp_ms", -1)
+            .find(query, projection)
+            .sort(PAGE_SORT)
             .limit(limit)
         )
 
         results = []
         async for doc in cursor:
-            doc["_id"] = str(doc["_id"])
             results.append(doc)
 
-        return results
+        next_cursor = encode_cursor(results[-1]) if len(results) == limit else None
+
+        for doc in results:
+            doc["_id"] = str(doc["_id"])
+
+        return results, next_cursor
     
     async def get_unprocessed_vehicle_data(
         self,
         vehicle_id: Optional[str] = None,
-        limit: int = 10
-    ) -> list[dict]:
+        limit: int = 10,
+        after: Optional[str] = None,
+        projection: Optional[dict] = None
+    ) -> tuple[list[dict], Optional[str]]:
 
         query = {
             "processing_meta.ai_processed": False
@@ -38,30 +63,256 @@ class IntelligenceRepo:
         if vehicle_id:
             query["vehicle_id"] = vehicle_id
 
-        return await self._fetch(query, limit)
+        return await self._fetch(query, limit, after, projection)
     
     
     async def get_all_vehicle_data(
         self,
         vehicle_id: Optional[str] = None,
-        limit: int = 10) -> list[dict]:
+        limit: int = 10,
+        after: Optional[str] = None,
+        projection: Optional[dict] = None
+    ) -> tuple[list[dict], Optional[str]]:
 
             query = {}
             if vehicle_id:
                 query["vehicle_id"] = vehicle_id
 
-            return await self._fetch(query, limit)
+            return await self._fetch(query, limit, after, projection)
 
-    async def insert_vehicle_data(self, payload: IntelligencePayload):
-        document = {
+    def _build_document(self, payload: IntelligencePayload, now_ts: int) -> dict:
+        return with_packet_id(with_time_field({
             **payload.model_dump(),
             "processing_meta": {
                 "ai_processed": False,
                 "processed_at": None,
-                "ai_version": None
+                "ai_version": None,
+                "leased_by": None,
+                "lease_until": None
             },
-            "ingested_at": int(time.time() * 1000)
+            "ingested_at": now_ts
+        }))
+
+    async def insert_vehicle_data(self, payload: IntelligencePayload):
+        document = self._build_document(payload, int(time.time() * 1000))
+
+        # coalesced with concurrent inserts into one insert_many; the flush also
+        # updates the latest state and rollups
+        inserted_id = await edge_state_writer.insert(document)
+
+        vehicle_hub.publish(payload.vehicle_id, "intelligence", document)
+        return inserted_id
+
+    async def insert_vehicle_data_batch(
+        self,
+        payloads: List[IntelligencePayload]
+    ) -> list[dict]:
+        """Returns a result per payload, in order (see insert_batch)."""
+        now_ts = int(time.time() * 1000)
+        documents = [self._build_document(p, now_ts) for p in payloads]
+        stored, results = await insert_batch(vehicle_edge_state, documents)
+
+        # the records are already stored; a rollup failure is repaired by the backfill
+        try:
+            await rollup_repo.apply(stored)
+        except Exception as e:
+            server.logger.error(f"Rollup update failed for batch: {e}")
+
+        for doc in stored:
+            vehicle_hub.publish(doc["vehicle_id"], "intelligence", doc)
+        await record_latest_many("intelligence", stored)
+
+        return results
+
+    # ------------------------------------------------------------
+    # AI work queue: leases instead of everyone polling /data/unprocessed
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _claimable(now_ts: int) -> dict:
+        # unprocessed and either never leased or the lease ran out (= re-queued)
+        return {
+            "processing_meta.ai_processed": False,
+            "$or": [
+                {"processing_meta.lease_until": None},
+                {"processing_meta.lease_until": {"$lt": now_ts}}
+            ]
+        }
+
+    @staticmethod
+    def _object_ids(ids: List[str]) -> list:
+        object_ids = []
+        for i in ids:
+            try:
+                object_ids.append(ObjectId(i))
+            except (InvalidId, TypeError):
+                continue
+        return object_ids
+
+    async def lease_unprocessed(
+        self,
+        worker_id: str,
+        limit: int,
+        lease_seconds: int,
+        vehicle_id: Optional[str] = None
+    ) -> tuple[int, list[dict]]:
+        """
+        Claim up to `limit` of the oldest claimable records for `worker_id`.
+
+        Three round-trips whatever the batch size: pick candidates, claim them
+        with one update_many that re-checks claimability per document (so two
+        workers racing for the same candidates can't both win one), then read
+        back the ones this claim actually got.
+        """
+        now_ts = int(time.time() * 1000)
+        lease_until = now_ts + lease_seconds * 1000
+        token = uuid.uuid4().hex
+
+        query = self._claimable(now_ts)
+        if vehicle_id:
+            query["vehicle_id"] = vehicle_id
+
+        candidates = await (
+            vehicle_edge_state
+            .find(query, {"_id": 1})
+            .sort("timestamp_ms", 1)
+            .limit(limit)
+            .to_list(length=limit)
+        )
+        if not candidates:
+            return lease_until, []
+
+        ids = [doc["_id"] for doc in candidates]
+
+        await vehicle_edge_state.update_many(
+            {"_id": {"$in": ids}, **self._claimable(now_ts)},
+            {"$set": {
+                "processing_meta.leased_by": worker_id,
+                "processing_meta.lease_until": lease_until,
+                "processing_meta.lease_token": token
+            }}
+        )
+
+        cursor = (
+            vehicle_edge_state
+            .find({"_id": {"$in": ids}, "processing_meta.lease_token": token})
+            .sort("timestamp_ms", 1)
+        )
+
+        results = []
+        async for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            results.append(doc)
+
+        return lease_until, results
+
+    async def extend_lease(
+        self,
+        worker_id: str,
+        ids: List[str],
+        lease_seconds: int
+    ) -> tuple[int, list[str]]:
+        """Heartbeat: push out the lease on records this worker still holds."""
+        lease_until = int(time.time() * 1000) + lease_seconds * 1000
+        held = {
+            "_id": {"$in": self._object_ids(ids)},
+            "processing_meta.ai_processed": False,
+            "processing_meta.leased_by": worker_id
         }
 
-        result = await vehicle_edge_state.insert_one(document)
-        return str(result.inserted_id)
\ No newline at end of file
+        await vehicle_edge_state.update_many(
+            held,
+            {"$set": {"processing_meta.lease_until": lease_until}}
+        )
+
+        # another worker may have taken over an expired lease; report what is really ours
+        extended = await vehicle_edge_state.find(
+            {**held, "processing_meta.lease_until": lease_until},
+            {"_id": 1}
+        ).to_list(length=None)
+
+        return lease_until, [str(doc["_id"]) for doc in extended]
+
+    async def release_lease(self, worker_id: str, ids: List[str]) -> int:
+        """Hand records back to the queue without processing them."""
+        result = await vehicle_edge_state.update_many(
+            {
+                "_id": {"$in": self._object_ids(ids)},
+                "processing_meta.ai_processed": False,
+                "processing_meta.leased_by": worker_id
+            },
+            {"$set": {
+                "processing_meta.leased_by": None,
+                "processing_meta.lease_until": None
+            }}
+        )
+        return result.modified_count
+
+    async def iter_vehicle_data(
+        self,
+        vehicle_id: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        projection: Optional[dict] = None,
+        batch_size: int = 1000
+    ):
+        """Stream a vehicle's records oldest first straight off the cursor, `batch_size` per round-trip."""
+        query = {"vehicle_id": vehicle_id}
+        if start_ms is not None or end_ms is not None:
+            query["timestamp_ms"] = {}
+            if start_ms is not None:
+                query["timestamp_ms"]["$gte"] = start_ms
+            if end_ms is not None:
+                query["timestamp_ms"]["$lt"] = end_ms
+
+        cursor = (
+            vehicle_edge_state
+            .find(query, projection)
+            .sort([("timestamp_ms", 1), ("_id", 1)])
+            .batch_size(batch_size)
+        )
+
+        async for doc in cursor:
+            yield doc
+
+    async def downsample(
+        self,
+        vehicle_id: str,
+        start_ms: int,
+        end_ms: int,
+        bucket_ms: int,
+        fields: List[str]
+    ) -> list[dict]:
+        """
+        min / mean / max of each field per time bucket, computed inside Mongo.
+        Buckets are aligned to start_ms (see bucket_start_expr).
+        """
+        group = {"_id": bucket_start_expr(start_ms, bucket_ms), "count": {"$sum": 1}}
+        for f in fields:
+            group[f"{f}__min"] = {"$min": f"${f}"}
+            group[f"{f}__mean"] = {"$avg": f"${f}"}
+            group[f"{f}__max"] = {"$max": f"${f}"}
+
+        pipeline = [
+            {"$match": {
+                "vehicle_id": vehicle_id,
+                "timestamp_ms": {"$gte": start_ms, "$lt": end_ms}
+            }},
+            {"$project": {"timestamp_ms": 1, **{f: 1 for f in fields}}},
+            {"$group": group},
+            {"$sort": {"_id": 1}},
+        ]
+
+        points = []
+        async for row in vehicle_edge_state.aggregate(pipeline):
+            point = {"t": row["_id"], "count": row["count"]}
+            for f in fields:
+                point[f] = {
+                    "min": row[f"{f}__min"],
+                    "mean": row[f"{f}__mean"],
+                    "max": row[f"{f}__max"]
+                }
+            points.append(point)
+
+        return points
+
@@ -0,0 +1,174 @@
+from typing import List, Optional
+from pymongo import UpdateOne
+from app.core.db import vehicle_edge_state, vehicle_rollups_1m, vehicle_rollups_1h
+
+# health-vector fields summarised in the rollups
+ROLLUP_FIELDS = (
+    "thermal_brake_margin",
+    "thermal_engine_margin",
+    "thermal_stress_index",
+    "mechanical_vibration_anomaly_score",
+    "mechanical_dominant_fault_band_hz",
+    "mechanical_vibration_rms",
+    "electrical_charging_efficiency_score",
+    "electrical_battery_health_pct",
+    "engine_rul_pct",
+    "brake_rul_pct",
+    "battery_rul_pct",
+    "vehicle_health_score",
+)
+
+# granularity -> (bucket size in ms, collection)
+GRANULARITIES = {
+    "1m": (60_000, vehicle_rollups_1m),
+    "1h": (3_600_000, vehicle_rollups_1h),
+}
+
+
+class RollupRepo:
+    """
+    Per-vehicle minute / hour rollups of the health vector:
+    { _id: "<vehicle_id>:<bucket_start>", vehicle_id, bucket_start, count,
+      sum: {field: ...}, min: {field: ...}, max: {field: ...} }
+    """
+
+    async def apply(self, documents: List[dict]):
+        """
+        Fold freshly ingested edge-state documents into every rollup.
+        Documents are pre-combined per (vehicle, bucket) so each bucket gets
+        one $inc/$min/$max upsert, and each granularity one bulk_write.
+        """
+        for bucket_ms, collection in GRANULARITIES.values():
+            buckets = {}
+
+            for doc in documents:
+                start = doc["timestamp_ms"] - doc["timestamp_ms"] % bucket_ms
+                key = (doc["vehicle_id"], start)
+                acc = buckets.get(key)
+
+                if acc is None:
+                    acc = buckets[key] = {"count": 0, "sum": {}, "min": {}, "max": {}}
+
+                acc["count"] += 1
+                for f in ROLLUP_FIELDS:
+                    v = doc.get(f)
+                    if v is None:
+                        continue
+                    acc["sum"][f] = acc["sum"].get(f, 0) + v
+                    acc["min"][f] = min(acc["min"].get(f, v), v)
+                    acc["max"][f] = max(acc["max"].get(f, v), v)
+
+            ops = [
+                UpdateOne(
+                    {"_id": f"{vehicle_id}:{start}"},
+                    {
+                        "$setOnInsert": {"vehicle_id": vehicle_id, "bucket_start": start},
+                        "$inc": {"count": acc["count"], **{f"sum.{f}": v for f, v in acc["sum"].items()}},
+                        "$min": {f"min.{f}": v for f, v in acc["min"].items()},
+                        "$max": {f"max.{f}": v for f, v in acc["max"].items()},
+                    },
+                    upsert=True
+                )
+                for (vehicle_id, start), acc in buckets.items()
+            ]
+
+            if ops:
+                await collection.bulk_write(ops, ordered=False)
+
+    async def get_rollups(
+        self,
+        granularity: str,
+        start_ms: int,
+        end_ms: int,
+        vehicle_id: Optional[str] = None
+    ) -> list[dict]:
+        """
+        One document per bucket, oldest first. Without a vehicle_id the
+        buckets of every vehicle are combined in Mongo into one fleet-wide
+        bucket per bucket_start.
+        """
+        _, collection = GRANULARITIES[granularity]
+
+        query = {"bucket_start": {"$gte": start_ms, "$lt": end_ms}}
+        if vehicle_id:
+            query["vehicle_id"] = vehicle_id
+            docs = collection.find(query).sort("bucket_start", 1)
+        else:
+            docs = collection.aggregate(self._fleet_pipeline(query))
+
+        results = []
+        async for doc in docs:
+            doc["mean"] = {f: s / doc["count"] for f, s in doc.get("sum", {}).items()}
+            results.append(doc)
+
+        return results
+
+    @staticmethod
+    def _fleet_pipeline(query: dict) -> list:
+        group = {"_id": "$bucket_start", "count": {"$sum": "$count"}}
+        for f in ROLLUP_FIELDS:
+            group[f"sum__{f}"] = {"$sum": f"$sum.{f}"}
+            group[f"min__{f}"] = {"$min": f"$min.{f}"}
+            group[f"max__{f}"] = {"$max": f"$max.{f}"}
+
+        return [
+            {"$match": query},
+            {"$group": group},
+            {"$project": {
+                "_id": 0,
+                "bucket_start": "$_id",
+                "count": 1,
+                "sum": {f: f"$sum__{f}" for f in ROLLUP_FIELDS},
+                "min": {f: f"$min__{f}" for f in ROLLUP_FIELDS},
+                "max": {f: f"$max__{f}" for f in ROLLUP_FIELDS},
+            }},
+            {"$sort": {"bucket_start": 1}},
+        ]
+
+    async def backfill(
+        self,
+        granularity: str,
+        until_ms: int,
+        since_ms: int = 0
+    ):
+        """
+        Rebuild rollups for [since_ms, until_ms) from vehicle_edge_state,
+        entirely inside Mongo ($group + $merge). Buckets are replaced, so
+        keep `until_ms` behind the buckets live ingest is still writing.
+        """
+        bucket_ms, collection = GRANULARITIES[granularity]
+        bucket_start = {"$subtract": ["$timestamp_ms", {"$mod": ["$timestamp_ms", bucket_ms]}]}
+
+        group = {
+            "_id": {"vehicle_id": "$vehicle_id", "bucket_start": bucket_start},
+            "count": {"$sum": 1},
+        }
+        for f in ROLLUP_FIELDS:
+            group[f"sum__{f}"] = {"$sum": f"${f}"}
+            group[f"min__{f}"] = {"$min": f"${f}"}
+            group[f"max__{f}"] = {"$max": f"${f}"}
+
+        pipeline = [
+            {"$match": {"timestamp_ms": {"$gte": since_ms, "$lt": until_ms}}},
+            {"$group": group},
+            {"$project": {
+                "_id": {"$concat": [
+                    "$_id.vehicle_id", ":", {"$toString": "$_id.bucket_start"}
+                ]},
+                "vehicle_id": "$_id.vehicle_id",
+                "bucket_start": "$_id.bucket_start",
+                "count": 1,
+                "sum": {f: f"$sum__{f}" for f in ROLLUP_FIELDS},
+                "min": {f: f"$min__{f}" for f in ROLLUP_FIELDS},
+                "max": {f: f"$max__{f}" for f in ROLLUP_FIELDS},
+            }},
+            {"$merge": {
+                "into": collection.name,
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }},
+        ]
+
+        async for _ in vehicle_edge_state.aggregate(pipeline, allowDiskUse=True):
+            pass
@@ -0,0 +1,67 @@
+from typing import Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.core.db import vehicle_latest_state_collection
+
+
+class StateCacheRepo:
+    """
+    One document per vehicle holding the newest record of each kind:
+    { vehicle_id, intelligence: {...}, insight: {...}, actuation: {...} }
+    """
+
+    @staticmethod
+    def _section_update(vehicle_id: str, section: str, document: dict) -> tuple[dict, dict]:
+        ts = document["timestamp_ms"]
+
+        # only overwrite an older (or missing) section; late arrivals must not regress the state
+        return (
+            {
+                "vehicle_id": vehicle_id,
+                "$or": [
+                    {f"{section}.timestamp_ms": {"$lt": ts}},
+                    {section: {"$exists": False}}
+                ]
+            },
+            {"$set": {section: document}}
+        )
+
+    async def upsert_section(self, vehicle_id: str, section: str, document: dict):
+        try:
+            await vehicle_latest_state_collection.update_one(
+                *self._section_update(vehicle_id, section, document),
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # filter missed because the stored section is newer; the upsert hit the unique vehicle_id
+            pass
+
+    async def upsert_sections(self, section: str, documents: dict) -> set:
+        """
+        upsert_section for many vehicles ({vehicle_id: document}) in one
+        unordered bulk_write. Returns the vehicle ids whose write failed.
+        """
+        vehicle_ids = list(documents)
+        ops = [
+            UpdateOne(*self._section_update(v, section, documents[v]), upsert=True)
+            for v in vehicle_ids
+        ]
+        if not ops:
+            return set()
+
+        try:
+            await vehicle_latest_state_collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # duplicate key: the stored section is newer, same as in upsert_section
+            return {
+                vehicle_ids[err["index"]]
+                for err in e.details.get("writeErrors", [])
+                if err.get("code") != 11000
+            }
+        return set()
+
+    async def get_state(self, vehicle_id: str) -> Optional[dict]:
+        return await vehicle_latest_state_collection.find_one(
+            {"vehicle_id": vehicle_id},
+            {"_id": 0}
+        )
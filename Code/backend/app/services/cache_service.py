@@ -0,0 +1,125 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from bson import ObjectId
+from uvicorn import server
+from app.core.config import settings
+from app.repositories.state_cache_repo import StateCacheRepo
+
+SECTIONS = ("intelligence", "insight", "actuation")
+
+
+class LatestStateCache:
+    """
+    Per-vehicle latest state, LRU-bounded with a TTL.
+
+    Entries are only created from a full read of vehicle_latest_state, so a
+    cached entry is never missing sections that exist in the database; writes
+    update entries that are already cached. The TTL bounds staleness when
+    other processes write the same vehicles.
+    """
+
+    def __init__(self, max_vehicles: int, ttl_sec: float):
+        self.max_vehicles = max_vehicles
+        self.ttl = ttl_sec
+        self._entries = OrderedDict()
+
+    def get(self, vehicle_id: str) -> Optional[dict]:
+        entry = self._entries.get(vehicle_id)
+        if entry is None:
+            return None
+
+        expires_at, state = entry
+        if expires_at < time.monotonic():
+            del self._entries[vehicle_id]
+            return None
+
+        self._entries.move_to_end(vehicle_id)
+        return state
+
+    def put(self, vehicle_id: str, state: dict):
+        self._entries[vehicle_id] = (time.monotonic() + self.ttl, state)
+        self._entries.move_to_end(vehicle_id)
+        while len(self._entries) > self.max_vehicles:
+            self._entries.popitem(last=False)
+
+    def update(self, vehicle_id: str, section: str, document: dict):
+        state = self.get(vehicle_id)
+        if state is None:
+            return
+
+        current = state.get(section)
+        if current is None or current["timestamp_ms"] < document["timestamp_ms"]:
+            state[section] = document
+
+
+latest_state_cache = LatestStateCache(
+    max_vehicles=settings.LATEST_STATE_CACHE_SIZE,
+    ttl_sec=settings.LATEST_STATE_TTL_SEC
+)
+state_repo = StateCacheRepo()
+
+
+def _jsonable(document: dict) -> dict:
+    return {
+        k: str(v) if isinstance(v, ObjectId) else v
+        for k, v in document.items()
+    }
+
+
+async def record_latest(vehicle_id: str, section: str, document: dict):
+    """Write-through: vehicle_latest_state first, then the in-process cache."""
+    document = _jsonable(document)
+    try:
+        await state_repo.upsert_section(vehicle_id, section, document)
+    except Exception as e:
+        # derived data: the record itself is already stored, don't fail the ingest over it
+        server.logger.error(f"Latest-state update failed for {vehicle_id}: {e}")
+        return
+    latest_state_cache.update(vehicle_id, section, document)
+
+
+def newest_per_vehicle(documents: list) -> dict:
+    newest = {}
+    for doc in documents:
+        vehicle_id = doc.get("vehicle_id")
+        if not vehicle_id:
+            continue
+        current = newest.get(vehicle_id)
+        if current is None or current["timestamp_ms"] < doc["timestamp_ms"]:
+            newest[vehicle_id] = doc
+    return newest
+
+
+async def record_latest_many(section: str, documents: list):
+    """record_latest for a batch: only the newest document per vehicle, all in one bulk_write."""
+    newest = {v: _jsonable(doc) for v, doc in newest_per_vehicle(documents).items()}
+    try:
+        failed = await state_repo.upsert_sections(section, newest)
+    except Exception as e:
+        server.logger.error(f"Latest-state update failed for {len(newest)} vehicles: {e}")
+        return
+
+    if failed:
+        server.logger.error(f"Latest-state update failed for {', '.join(sorted(failed))}")
+    for vehicle_id, document in newest.items():
+        if vehicle_id not in failed:
+            latest_state_cache.update(vehicle_id, section, document)
+
+
+async def get_latest_state(vehicle_id: str) -> Optional[dict]:
+    state = latest_state_cache.get(vehicle_id)
+    if state is not None:
+        return state
+
+    state = await state_repo.get_state(vehicle_id)
+    if state is not None:
+        latest_state_cache.put(vehicle_id, state)
+    return state
+
+
+async def get_latest_section(vehicle_id: str, section: str) -> Optional[dict]:
+    state = await get_latest_state(vehicle_id)
+    if state is None:
+        return None
+    return state.get(section)
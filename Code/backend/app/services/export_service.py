@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, List
+
+# rows are coalesced into chunks of roughly this size before being sent
+CHUNK_BYTES = 64 * 1024
+
+
+def _json_default(value):
+    # ObjectId, datetime, ...
+    return str(value)
+
+
+async def ndjson_chunks(docs: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    async for doc in docs:
+        buf.write(json.dumps(doc, default=_json_default))
+        buf.write("\n")
+        if buf.tell() >= CHUNK_BYTES:
+            yield buf.getvalue().encode()
+            buf = io.StringIO()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+async def csv_chunks(docs: AsyncIterator[dict], columns: List[str]) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+
+    async for doc in docs:
+        writer.writerow([
+            json.dumps(v, default=_json_default) if isinstance(v, (dict, list))
+            else "" if v is None
+            else str(v) if not isinstance(v, (int, float, str, bool))
+            else v
+            for v in (doc.get(c) for c in columns)
+        ])
+        if buf.tell() >= CHUNK_BYTES:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # wbits=31 -> gzip container, compressed incrementally so nothing is held in memory
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
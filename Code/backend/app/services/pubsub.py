@@ -0,0 +1,71 @@
+import asyncio
+import json
+from collections import defaultdict
+from app.core.config import settings
+
+
+class Subscriber:
+    def __init__(self, vehicle_ids: set, queue_size: int):
+        self.vehicle_ids = vehicle_ids
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        self.closed = False
+
+
+class VehicleHub:
+    """
+    In-process fan-out of new vehicle records to stream subscribers.
+
+    publish() never waits on a subscriber: each one has a bounded queue and,
+    when it is full, the oldest frame is dropped. A subscriber that keeps
+    falling behind (more than `max_drops` drops in a row) is disconnected.
+    """
+
+    def __init__(self, queue_size: int, max_drops: int):
+        self.queue_size = queue_size
+        self.max_drops = max_drops
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, vehicle_ids: set) -> Subscriber:
+        sub = Subscriber(vehicle_ids, self.queue_size)
+        for vehicle_id in vehicle_ids:
+            self._subscribers[vehicle_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        sub.closed = True
+        for vehicle_id in sub.vehicle_ids:
+            subs = self._subscribers.get(vehicle_id)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[vehicle_id]
+
+    def publish(self, vehicle_id: str, kind: str, document: dict):
+        subs = self._subscribers.get(vehicle_id)
+        if not subs:
+            return
+
+        # encoded once, shared by every subscriber
+        frame = f"event: {kind}\ndata: {json.dumps(document, default=str)}\n\n"
+
+        for sub in list(subs):
+            try:
+                sub.queue.put_nowait(frame)
+                sub.dropped = 0
+            except asyncio.QueueFull:
+                sub.queue.get_nowait()
+                sub.dropped += 1
+                if sub.dropped > self.max_drops:
+                    # slow consumer: make room for the close marker and cut it loose
+                    self.unsubscribe(sub)
+                    sub.queue.put_nowait(None)
+                else:
+                    sub.queue.put_nowait(frame)
+
+
+vehicle_hub = VehicleHub(
+    queue_size=settings.STREAM_QUEUE_SIZE,
+    max_drops=settings.STREAM_MAX_DROPS
+)
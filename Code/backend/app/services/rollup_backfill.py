@@ -0,0 +1,27 @@
+import argparse
+import asyncio
+import time
+from app.repositories.rollup_repo import RollupRepo, GRANULARITIES
+
+
+async def _main(args):
+    repo = RollupRepo()
+
+    for granularity in args.granularity:
+        bucket_ms, _ = GRANULARITIES[granularity]
+        # default: stop at the start of the current bucket, which live ingest still owns
+        until_ms = args.until_ms or int(time.time() * 1000) // bucket_ms * bucket_ms
+
+        print(f"Backfilling {granularity} rollups [{args.since_ms}, {until_ms})")
+        await repo.backfill(granularity, until_ms=until_ms, since_ms=args.since_ms)
+
+    print("Done")
+
+
+if __name__ == "__main__":
+    # python -m app.services.rollup_backfill [--granularity 1m 1h] [--since-ms N] [--until-ms N]
+    parser = argparse.ArgumentParser(description="Rebuild health-vector rollups from vehicle_edge_state")
+    parser.add_argument("--granularity", nargs="+", choices=list(GRANULARITIES), default=list(GRANULARITIES))
+    parser.add_argument("--since-ms", type=int, default=0)
+    parser.add_argument("--until-ms", type=int, default=None)
+    asyncio.run(_main(parser.parse_args()))
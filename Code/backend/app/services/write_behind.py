@@ -0,0 +1,173 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+from pymongo.errors import BulkWriteError, WriteError
+from uvicorn import server
+from app.core.config import settings
+from app.core.db import vehicle_edge_state, actuation_events
+from app.repositories.rollup_repo import RollupRepo
+from app.services.cache_service import record_latest_many
+
+
+# a document with this _id is already stored: a replay of a fog packet (see with_packet_id)
+DUPLICATE_KEY = 11000
+
+
+async def insert_documents(collection, documents: list) -> dict[int, dict]:
+    """
+    One unordered insert_many. Returns the write errors by document index;
+    every document not in it was stored. Other errors are raised.
+    """
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        return {err["index"]: err for err in e.details.get("writeErrors", [])}
+    return {}
+
+
+async def insert_batch(collection, documents: list) -> tuple[list, list[dict]]:
+    """
+    Store a whole /insert_batch request with one insert_many.
+    Returns (newly stored documents, a result per document in order),
+    so callers can retry only the failures. A replayed document is "ok"
+    (marked duplicate) but not in the stored list, so follow-up work
+    such as rollups isn't applied twice.
+    """
+    if not documents:
+        return [], []
+
+    failed = await insert_documents(collection, documents)
+
+    stored = []
+    results = []
+    for i, doc in enumerate(documents):
+        err = failed.get(i)
+        if err is None:
+            stored.append(doc)
+            results.append({"status": "ok", "inserted_id": str(doc["_id"])})
+        elif err.get("code") == DUPLICATE_KEY:
+            results.append({"status": "ok", "inserted_id": str(doc["_id"]), "duplicate": True})
+        else:
+            results.append({"status": "failed", "detail": err.get("errmsg", "write failed")})
+    return stored, results
+
+
+class WriteBehindBuffer:
+    """
+    Coalesces single-document inserts into one insert_many.
+
+    A batch is flushed when it reaches `max_batch` documents or
+    `max_delay_ms` after its first document, whichever comes first.
+    insert() only returns once its own document is written (or raises
+    the write error), so callers keep the delivery guarantee of insert_one.
+
+    `on_flush`, if given, runs once per flushed batch with the documents
+    that were written, after their callers have been released.
+    """
+
+    def __init__(
+        self,
+        collection,
+        max_batch: int,
+        max_delay_ms: int,
+        on_flush: Optional[Callable[[list], Awaitable]] = None
+    ):
+        self.collection = collection
+        self.on_flush = on_flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._pending = []
+        self._timer = None
+        self._inflight = set()
+
+    async def insert(self, document: dict) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((document, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_now)
+
+        return await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _write(self, batch):
+        documents = [doc for doc, _ in batch]
+
+        try:
+            failed = await insert_documents(self.collection, documents)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        written = []
+        for i, (doc, future) in enumerate(batch):
+            if i in failed:
+                err = failed[i]
+                if err.get("code") == DUPLICATE_KEY:
+                    # already stored by an earlier delivery: succeed, but skip on_flush
+                    if not future.done():
+                        future.set_result(str(doc["_id"]))
+                    continue
+                if not future.done():
+                    future.set_exception(WriteError(err.get("errmsg"), err.get("code"), err))
+                continue
+            written.append(doc)
+            if not future.done():
+                future.set_result(str(doc["_id"]))
+
+        if self.on_flush and written:
+            try:
+                await self.on_flush(written)
+            except Exception as e:
+                server.logger.error(f"Post-flush hook failed on {self.collection.name}: {e}")
+
+    async def flush(self):
+        self._flush_now()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+
+rollup_repo = RollupRepo()
+
+
+async def _edge_state_flushed(documents: list):
+    await record_latest_many("intelligence", documents)
+    await rollup_repo.apply(documents)
+
+
+async def _actuation_flushed(documents: list):
+    await record_latest_many("actuation", documents)
+
+
+# latest state and rollups are folded in once per flushed batch, not once per request
+edge_state_writer = WriteBehindBuffer(
+    vehicle_edge_state,
+    max_batch=settings.INGEST_BATCH_MAX,
+    max_delay_ms=settings.INGEST_FLUSH_MS,
+    on_flush=_edge_state_flushed
+)
+
+actuation_writer = WriteBehindBuffer(
+    actuation_events,
+    max_batch=settings.INGEST_BATCH_MAX,
+    max_delay_ms=settings.INGEST_FLUSH_MS,
+    on_flush=_actuation_flushed
+)
+
+
+async def flush_all():
+    await asyncio.gather(edge_state_writer.flush(), actuation_writer.flush())
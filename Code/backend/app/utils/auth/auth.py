@@ -1,5 +1,5 @@
 from fastapi import Header, HTTPException
-from app.core.firebase import verify_firebase_token
+from app.utils.auth.token_cache import verify_token
 
 
 async def get_current_user(authorization: str = Header(...)):
@@ -10,7 +10,7 @@ async def get_current_user(authorization: str = Header(...)):
     token = authorization.split(" ")[1]
 
     try:
-        decoded = verify_firebase_token(token)
+        decoded = await verify_token(token)
         return decoded
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
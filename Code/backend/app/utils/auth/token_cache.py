@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from app.core.config import settings
+from app.core.firebase import verify_firebase_token
+
+
+class TokenCache:
+    """
+    Decoded ID tokens, LRU-bounded and keyed by the token's SHA-256 so raw
+    tokens are not kept in memory. An entry is only served until the token's
+    own `exp`, so a cache hit never accepts a token the SDK would reject as expired.
+    `clock` returns epoch seconds, the unit of `exp`.
+    """
+
+    def __init__(self, max_tokens: int, clock: Callable[[], float] = time.time):
+        self.max_tokens = max_tokens
+        self.clock = clock
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        exp, decoded = entry
+        if exp <= self.clock():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return decoded
+
+    def put(self, key: str, decoded: dict):
+        exp = decoded.get("exp")
+        if exp is None:
+            return
+
+        self._entries[key] = (exp, decoded)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_tokens:
+            self._entries.popitem(last=False)
+
+    def invalidate_uid(self, uid: str):
+        """
+        Drop every cached token of a user, e.g. after revoking their sessions
+        or disabling the account, so none is accepted again before its `exp`.
+        """
+        for key in [k for k, (_, decoded) in self._entries.items() if decoded.get("uid") == uid]:
+            del self._entries[key]
+
+
+token_cache = TokenCache(max_tokens=settings.AUTH_TOKEN_CACHE_SIZE)
+
+# verify_id_token is blocking (RSA verify, occasionally a cert fetch); the SDK
+# caches Google's certs itself, honouring their Cache-Control
+_executor = ThreadPoolExecutor(max_workers=settings.AUTH_VERIFY_WORKERS, thread_name_prefix="token-verify")
+
+# concurrent requests carrying the same uncached token share one verification
+_in_flight: dict[str, asyncio.Future] = {}
+
+
+async def verify_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).hexdigest()
+
+    decoded = token_cache.get(key)
+    if decoded is not None:
+        return decoded
+
+    pending = _in_flight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().run_in_executor(_executor, verify_firebase_token, token)
+    _in_flight[key] = future
+    try:
+        decoded = await asyncio.shield(future)
+    finally:
+        _in_flight.pop(key, None)
+
+    token_cache.put(key, decoded)
+    return decoded
@@ -1,19 +1,65 @@
 import time
+from collections import OrderedDict
+from typing import Callable
+from app.core.config import settings
 from app.core.db import users
 
 
+class KnownUsers:
+    """
+    LRU-bounded set of uids already known to have a users document.
+    Entries expire after `ttl_sec`, so a users document removed outside
+    this process is recreated on the user's next request.
+    """
+
+    def __init__(self, max_users: int, ttl_sec: float, clock: Callable[[], float] = time.monotonic):
+        self.max_users = max_users
+        self.ttl = ttl_sec
+        self.clock = clock
+        self._uids = OrderedDict()
+
+    def __contains__(self, uid: str) -> bool:
+        expires_at = self._uids.get(uid)
+        if expires_at is None:
+            return False
+        if expires_at < self.clock():
+            del self._uids[uid]
+            return False
+        self._uids.move_to_end(uid)
+        return True
+
+    def add(self, uid: str):
+        self._uids[uid] = self.clock() + self.ttl
+        self._uids.move_to_end(uid)
+        while len(self._uids) > self.max_users:
+            self._uids.popitem(last=False)
+
+    def discard(self, uid: str):
+        self._uids.pop(uid, None)
+
+
+known_users = KnownUsers(
+    max_users=settings.KNOWN_USERS_CACHE_SIZE,
+    ttl_sec=settings.KNOWN_USERS_TTL_SEC
+)
+
+
 async def ensure_user_exists(decoded_token):
 
     uid = decoded_token["uid"]
-    email = decoded_token.get("email")
 
-    existing = await users.find_one({"_id": uid})
+    if uid in known_users:
+        return uid
 
-    if not existing:
-        await users.insert_one({
-            "_id": uid,
-            "email": email,
+    # atomic: concurrent first requests for the same uid can't both insert
+    await users.update_one(
+        {"_id": uid},
+        {"$setOnInsert": {
+            "email": decoded_token.get("email"),
             "created_at": int(time.time() * 1000)
-        })
+        }},
+        upsert=True
+    )
 
+    known_users.add(uid)
     return uid
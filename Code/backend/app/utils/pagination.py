@@ -0,0 +1,51 @@
+import base64
+import json
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# keyset order for every paged history query
+PAGE_SORT = [("timestamp_ms", -1), ("_id", -1)]
+
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque cursor pointing just past `doc` in PAGE_SORT order."""
+    raw = json.dumps([doc["timestamp_ms"], str(doc["_id"])]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def cursor_filter(cursor: str) -> dict:
+    """Mongo filter for everything after the cursor position."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp_ms, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        last_id = ObjectId(last_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {
+        "$or": [
+            {"timestamp_ms": {"$lt": timestamp_ms}},
+            {"timestamp_ms": timestamp_ms, "_id": {"$lt": last_id}}
+        ]
+    }
+
+
+def parse_fields(fields: Optional[str]) -> Optional[dict]:
+    """
+    `fields=a,b,c` -> Mongo projection. timestamp_ms and _id are always
+    returned since the next cursor is built from them.
+    """
+    if not fields:
+        return None
+
+    projection = {f.strip(): 1 for f in fields.split(",") if f.strip()}
+    if not projection:
+        return None
+
+    projection["timestamp_ms"] = 1
+    return projection
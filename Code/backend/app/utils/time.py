@@ -0,0 +1,30 @@
+import math
+
+# "round" bucket sizes a chart axis can label, in ms
+BUCKET_STEPS_MS = [
+    1_000, 5_000, 10_000, 30_000,
+    60_000, 5 * 60_000, 10 * 60_000, 30 * 60_000,
+    3_600_000, 3 * 3_600_000, 6 * 3_600_000, 12 * 3_600_000,
+    86_400_000, 7 * 86_400_000,
+]
+
+
+def choose_bucket_ms(range_ms: int, max_points: int) -> int:
+    """Smallest round bucket that keeps `range_ms` within `max_points` buckets."""
+    needed = math.ceil(max(range_ms, 1) / max(max_points, 1))
+    for step in BUCKET_STEPS_MS:
+        if step >= needed:
+            return step
+    return BUCKET_STEPS_MS[-1] * math.ceil(needed / BUCKET_STEPS_MS[-1])
+
+
+def bucket_start_expr(start_ms: int, bucket_ms: int, field: str = "$timestamp_ms") -> dict:
+    """
+    Mongo expression for the start of the `bucket_ms` bucket holding `field`.
+    Buckets are aligned to start_ms (not the epoch), with integer arithmetic
+    since timestamp_ms is epoch millis rather than a Date.
+    """
+    return {"$subtract": [
+        field,
+        {"$mod": [{"$subtract": [field, start_ms]}, bucket_ms]}
+    ]}
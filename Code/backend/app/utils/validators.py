@@ -0,0 +1,136 @@
+import json
+import zlib
+from typing import Awaitable, Callable, Optional, Type
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from app.core.config import settings
+from app.utils.wire import is_msgpack, unpack, from_wire
+
+MAX_BATCH_SIZE = 1000
+
+
+async def read_batch(request: Request, kind: Optional[str] = None) -> list:
+    """
+    Decode a batch request body: a JSON array, NDJSON or a msgpack array,
+    by content type. Any of them may be gzip'd (Content-Encoding: gzip).
+    The body is capped at MAX_BATCH_BYTES both as sent and once decompressed.
+    msgpack items in the int-keyed wire schema of `kind` are mapped to field names.
+    """
+    limit = settings.MAX_BATCH_BYTES
+    body = await _read_body(request, limit)
+
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        body = _gunzip(body, limit)
+
+    if is_msgpack(request):
+        items = unpack(body)
+        if kind and isinstance(items, list):
+            items = [from_wire(item, kind) for item in items]
+    else:
+        items = _parse_json(request, body)
+
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected an array of payloads")
+
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large, max {MAX_BATCH_SIZE} payloads"
+        )
+
+    return items
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Batch body too large, max {limit} bytes")
+
+
+async def _read_body(request: Request, limit: int) -> bytes:
+    # stop reading as soon as the cap is passed instead of buffering the whole upload
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise _too_large(limit)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _gunzip(body: bytes, limit: int) -> bytes:
+    # bounded output, so a small gzip bomb can't expand into gigabytes
+    decompressor = zlib.decompressobj(wbits=31)
+    try:
+        data = decompressor.decompress(body, limit)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+
+    if decompressor.unconsumed_tail:
+        raise _too_large(limit)
+    if not decompressor.eof:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+    return data
+
+
+def _parse_json(request: Request, body: bytes):
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed JSON body")
+
+    return items
+
+
+def validate_batch(items: list, model: Type[BaseModel]):
+    """
+    Validate every item independently.
+    Returns ([(index, model)], [per-item error results]).
+    """
+    valid = []
+    errors = []
+
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, model.model_validate(item)))
+        except ValidationError as e:
+            errors.append({
+                "index": index,
+                "status": "invalid",
+                "detail": e.errors(include_url=False, include_context=False, include_input=False)
+            })
+
+    return valid, errors
+
+
+async def ingest_batch(
+    request: Request,
+    model: Type[BaseModel],
+    store: Callable[[list], Awaitable[list]],
+    kind: Optional[str] = None,
+    error_detail: str = "Failed to store batch"
+) -> dict:
+    """
+    Shared body of the batch endpoints: decode, validate each item, hand the
+    valid payloads to `store` (one result per payload, in order) and merge
+    its results with the validation errors, by index.
+    """
+    items = await read_batch(request, kind=kind)
+    valid, results = validate_batch(items, model)
+
+    try:
+        stored = await store([p for _, p in valid])
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(status_code=500, detail=error_detail)
+
+    results += [{"index": index, **r} for (index, _), r in zip(valid, stored)]
+    results.sort(key=lambda r: r["index"])
+
+    return {
+        "inserted": sum(r["status"] == "ok" for r in results),
+        "results": results
+    }
@@ -0,0 +1,157 @@
+from typing import Type
+import msgpack
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Compact encoding for fog uplink: a msgpack map whose int keys are field ids.
+# Key 0 carries the schema version; field id n is WIRE_SCHEMAS[version][kind][n - 1].
+# A version is frozen once a fog build ships it - add fields in a new version that
+# extends the previous tuple, never reorder. fog_node.py keeps a copy (WIRE_FIELDS).
+# String keys are passed through unchanged, so fields outside the schema still arrive.
+VERSION_KEY = 0
+
+_INTELLIGENCE_V1 = (
+    "vehicle_id",
+    "timestamp_ms",
+    "fog_decision_critical_class",
+    "fog_decision_actuation_triggered",
+    "fog_decision_confidence",
+    "thermal_brake_margin",
+    "thermal_engine_margin",
+    "thermal_stress_index",
+    "mechanical_vibration_anomaly_score",
+    "mechanical_dominant_fault_band_hz",
+    "mechanical_vibration_rms",
+    "electrical_charging_efficiency_score",
+    "electrical_battery_health_pct",
+    "engine_rul_pct",
+    "brake_rul_pct",
+    "battery_rul_pct",
+    "vehicle_health_score",
+    "trigger_measured_brake_temp_c",
+    "trigger_brake_temp_rise_rate",
+    "trigger_brake_health_index",
+    "fog_thermal_protection_active",
+    "fog_brake_stress_mitigation_active",
+    "fog_vibration_damping_mode_active",
+    "fog_predictive_service_required",
+    "fog_emergency_safeguard_active",
+)
+
+_ACTUATION_V1 = (
+    "vehicle_id",
+    "timestamp_ms",
+    "decision_origin",
+    "cloud_dependency",
+    "trigger_measured_brake_temp_c",
+    "trigger_brake_temp_rise_rate",
+    "trigger_brake_health_index",
+    "fog_decision_critical_class",
+    "fog_decision_actuation_triggered",
+    "fog_decision_confidence",
+    "fog_thermal_protection_active",
+    "fog_brake_stress_mitigation_active",
+    "fog_vibration_damping_mode_active",
+    "fog_predictive_service_required",
+    "fog_emergency_safeguard_active",
+)
+
+_INTELLIGENCE_V2 = _INTELLIGENCE_V1 + (
+    "send_reason",
+)
+
+_INTELLIGENCE_V3 = _INTELLIGENCE_V2 + (
+    "packet_id",
+)
+
+_ACTUATION_V3 = _ACTUATION_V1 + (
+    "packet_id",
+)
+
+WIRE_SCHEMAS = {
+    1: {
+        "intelligence": _INTELLIGENCE_V1,
+        "actuation": _ACTUATION_V1,
+    },
+    2: {
+        "intelligence": _INTELLIGENCE_V2,
+        "actuation": _ACTUATION_V1,
+    },
+    3: {
+        "intelligence": _INTELLIGENCE_V3,
+        "actuation": _ACTUATION_V3,
+    },
+}
+
+
+def is_msgpack(request: Request) -> bool:
+    return request.headers.get("content-type", "").split(";")[0].strip().lower() in MSGPACK_TYPES
+
+
+def unpack(body: bytes):
+    try:
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    except (ValueError, msgpack.UnpackException):
+        raise HTTPException(status_code=400, detail="Malformed msgpack body")
+
+
+def from_wire(item, kind: str):
+    """Int-keyed wire map -> field-name dict. Anything else is returned as is."""
+    if not isinstance(item, dict) or VERSION_KEY not in item:
+        return item
+
+    version = item[VERSION_KEY]
+    fields = WIRE_SCHEMAS.get(version, {}).get(kind)
+    if fields is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported wire schema version: {version}")
+
+    decoded = {}
+    for key, value in item.items():
+        if isinstance(key, int):
+            if key == VERSION_KEY:
+                continue
+            if not 0 < key <= len(fields):
+                raise HTTPException(status_code=400, detail=f"Unknown field id {key} in schema v{version}")
+            decoded[fields[key - 1]] = value
+        else:
+            decoded[key] = value
+
+    return decoded
+
+
+def wire_body(model: Type[BaseModel], kind: str):
+    """
+    Body dependency accepting JSON or msgpack (by Content-Type), validated
+    straight into `model`. Validation errors keep FastAPI's 422 shape.
+    """
+
+    async def dependency(request: Request) -> BaseModel:
+        body = await request.body()
+        try:
+            if is_msgpack(request):
+                return model.model_validate(from_wire(unpack(body), kind))
+            return model.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError([
+                {**err, "loc": ("body", *err["loc"])}
+                for err in e.errors(include_url=False)
+            ])
+
+    return dependency
+
+
+def wire_openapi(model: Type[BaseModel]) -> dict:
+    """openapi_extra documenting both request encodings for a wire_body endpoint."""
+    schema = model.model_json_schema()
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": schema},
+                "application/msgpack": {"schema": schema},
+            },
+        }
+    }
@@ -0,0 +1,94 @@
+"""
+/vehicle/my query cost as the number of owned vehicles grows:
+the previous per-vehicle find_one loop (N+1) against the $lookup pipeline.
+
+Needs a reachable MongoDB (MONGO_URI from .env). Data is written to a
+separate "<MONGO_DB_NAME>_bench" database, which is dropped afterwards.
+
+    python -m benchmarks.my_vehicles_bench [--sizes 1 10 100 500] [--repeat 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from pymongo import ASCENDING, IndexModel
+from app.core.config import settings
+from app.core.db import client
+from app.api.vehicle import my_vehicles_pipeline
+
+BENCH_UID = "bench_user"
+
+
+async def n_plus_one(vehicles, ownership, uid):
+    results = []
+    async for record in ownership.find({"user_id": uid}):
+        vehicle = await vehicles.find_one({"vehicle_id": record["vehicle_id"]})
+        if vehicle:
+            results.append(vehicle)
+    return results
+
+
+async def lookup(vehicles, ownership, uid):
+    return await ownership.aggregate(my_vehicles_pipeline(uid)).to_list(length=None)
+
+
+async def seed(vehicles, ownership, n):
+    await vehicles.delete_many({})
+    await ownership.delete_many({})
+
+    now = int(time.time() * 1000)
+    await vehicles.insert_many([
+        {
+            "vehicle_id": f"BENCH_{i:05d}",
+            "vin": f"VIN{i:014d}",
+            "dealership_name": "bench",
+            "activation_code": "000000",
+            "activation_status": "claimed",
+            "created_at": now
+        }
+        for i in range(n)
+    ])
+    await ownership.insert_many([
+        {"vehicle_id": f"BENCH_{i:05d}", "user_id": BENCH_UID, "claimed_at": now}
+        for i in range(n)
+    ])
+
+
+async def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main(sizes, repeat):
+    db = client[f"{settings.MONGO_DB_NAME}_bench"]
+    vehicles = db["vehicles"]
+    ownership = db["vehicle_ownership"]
+
+    # same indexes as app.core.indexes
+    await vehicles.create_indexes([IndexModel([("vehicle_id", ASCENDING)], unique=True)])
+    await ownership.create_indexes([IndexModel([("user_id", ASCENDING), ("vehicle_id", ASCENDING)])])
+
+    # the pipeline looks vehicles up by collection name, in the bench database
+    assert vehicles.name == "vehicles"
+
+    print(f"{'vehicles':>8}  {'N+1 ms':>9}  {'$lookup ms':>10}  {'speedup':>7}")
+    try:
+        for n in sizes:
+            await seed(vehicles, ownership, n)
+            old = await timed(lambda: n_plus_one(vehicles, ownership, BENCH_UID), repeat)
+            new = await timed(lambda: lookup(vehicles, ownership, BENCH_UID), repeat)
+            print(f"{n:>8}  {old:>9.2f}  {new:>10.2f}  {old / new:>6.1f}x")
+    finally:
+        await client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
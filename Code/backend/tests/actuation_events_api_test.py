@@ -0,0 +1,48 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from asgi_lifespan import LifespanManager
+from app.main import app
+
+
+def _event(vehicle_id="TEST_CAR_001", timestamp_ms=1707051123456):
+    return {
+        "vehicle_id": vehicle_id,
+        "timestamp_ms": timestamp_ms,
+        "decision_origin": "fog_node",
+        "cloud_dependency": False,
+        "trigger_measured_brake_temp_c": 212.4,
+        "trigger_brake_temp_rise_rate": 4.1,
+        "trigger_brake_health_index": 0.32,
+        "fog_decision_critical_class": 1,
+        "fog_decision_actuation_triggered": 1,
+        "fog_decision_confidence": 0.93,
+        "fog_thermal_protection_active": True,
+        "fog_brake_stress_mitigation_active": True,
+        "fog_vibration_damping_mode_active": False,
+        "fog_predictive_service_required": True,
+        "fog_emergency_safeguard_active": False
+    }
+
+
+@pytest.mark.asyncio
+async def test_insert_actuation_event_batch():
+    payload = [
+        _event("TEST_ACT_BATCH", 1707051123456),
+        {"vehicle_id": "TEST_ACT_BATCH"},
+        _event("TEST_ACT_BATCH", 1707051123481),
+    ]
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            response = await ac.post("/api/actuation_events/insert_batch", json=payload)
+            latest = await ac.get("/api/actuation_events/latest", params={"vehicle_id": "TEST_ACT_BATCH"})
+
+    assert response.status_code == 201
+    body = response.json()
+    assert body["inserted"] == 2
+    assert [r["status"] for r in body["results"]] == ["ok", "invalid", "ok"]
+    assert latest.json()["timestamp_ms"] == 1707051123481
@@ -0,0 +1,99 @@
+from app.utils.auth.token_cache import TokenCache
+from app.utils.auth.user_service import KnownUsers
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _decoded(uid, exp):
+    return {"uid": uid, "exp": exp}
+
+
+def test_token_served_until_exp():
+    clock = FakeClock()
+    cache = TokenCache(max_tokens=10, clock=clock)
+    cache.put("k1", _decoded("u1", exp=clock.now + 60))
+
+    clock.now += 59.9
+    assert cache.get("k1")["uid"] == "u1"
+
+    clock.now += 0.1  # exactly exp: the SDK would reject it, so must the cache
+    assert cache.get("k1") is None
+    assert cache.get("k1") is None
+
+
+def test_token_without_exp_is_not_cached():
+    cache = TokenCache(max_tokens=10, clock=FakeClock())
+    cache.put("k1", {"uid": "u1"})
+    assert cache.get("k1") is None
+
+
+def test_least_recently_used_token_is_evicted():
+    clock = FakeClock()
+    cache = TokenCache(max_tokens=2, clock=clock)
+    cache.put("k1", _decoded("u1", clock.now + 60))
+    cache.put("k2", _decoded("u2", clock.now + 60))
+
+    cache.get("k1")  # k2 is now the least recently used
+    cache.put("k3", _decoded("u3", clock.now + 60))
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") is not None
+    assert cache.get("k3") is not None
+
+
+def test_invalidate_uid_drops_all_of_a_users_tokens():
+    clock = FakeClock()
+    cache = TokenCache(max_tokens=10, clock=clock)
+    cache.put("k1", _decoded("u1", clock.now + 60))
+    cache.put("k2", _decoded("u1", clock.now + 120))
+    cache.put("k3", _decoded("u2", clock.now + 60))
+
+    cache.invalidate_uid("u1")
+    cache.invalidate_uid("nobody")
+
+    assert cache.get("k1") is None
+    assert cache.get("k2") is None
+    assert cache.get("k3")["uid"] == "u2"
+
+
+def test_known_user_expires_after_ttl():
+    clock = FakeClock(now=0.0)
+    known = KnownUsers(max_users=10, ttl_sec=60, clock=clock)
+    known.add("u1")
+
+    clock.now = 60
+    assert "u1" in known
+    clock.now = 60.1
+    assert "u1" not in known
+
+    known.add("u1")  # re-added after the users document was checked again
+    assert "u1" in known
+
+
+def test_least_recently_seen_user_is_evicted():
+    known = KnownUsers(max_users=2, ttl_sec=60, clock=FakeClock(now=0.0))
+    known.add("u1")
+    known.add("u2")
+
+    assert "u1" in known  # u2 is now the least recently seen
+    known.add("u3")
+
+    assert "u2" not in known
+    assert "u1" in known
+    assert "u3" in known
+
+
+def test_discard_forgets_a_user():
+    known = KnownUsers(max_users=10, ttl_sec=60, clock=FakeClock(now=0.0))
+    known.add("u1")
+
+    known.discard("u1")
+    known.discard("u1")
+
+    assert "u1" not in known
@@ -0,0 +1,73 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from bson import ObjectId
+from app.services import export_service
+from app.services.export_service import ndjson_chunks, csv_chunks, gzip_chunks
+
+IDS = [ObjectId() for _ in range(50)]
+
+
+async def _cursor():
+    # stands in for a Motor cursor: an async iterator of documents
+    for i, oid in enumerate(IDS):
+        yield {
+            "_id": oid,
+            "timestamp_ms": 1707051123456 + i,
+            "vehicle_health_score": 0.5 + i / 100,
+            "fog_emergency_safeguard_active": i % 2 == 0,
+            "send_reason": None,
+            "processing_meta": {"ai_processed": False},
+        }
+
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # a few rows per chunk, so the stream is split the way a large export would be
+    monkeypatch.setattr(export_service, "CHUNK_BYTES", 512)
+
+
+@pytest.mark.asyncio
+async def test_ndjson_one_document_per_line(small_chunks):
+    chunks = await _collect(ndjson_chunks(_cursor()))
+
+    assert len(chunks) > 1
+    # chunks end on a line boundary, so a client can parse each one as it arrives
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+
+    lines = b"".join(chunks).decode().splitlines()
+    assert len(lines) == len(IDS)
+    first = json.loads(lines[0])
+    assert first["_id"] == str(IDS[0])
+    assert first["processing_meta"] == {"ai_processed": False}
+    assert first["send_reason"] is None
+
+
+@pytest.mark.asyncio
+async def test_csv_header_and_rows(small_chunks):
+    columns = ["_id", "timestamp_ms", "vehicle_health_score", "fog_emergency_safeguard_active",
+               "send_reason", "processing_meta", "missing"]
+    chunks = await _collect(csv_chunks(_cursor(), columns))
+
+    assert len(chunks) > 1
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert rows[0] == columns
+    assert len(rows) == len(IDS) + 1
+    assert rows[1] == [
+        str(IDS[0]), "1707051123456", "0.5", "True", "", '{"ai_processed": false}', ""
+    ]
+
+
+@pytest.mark.asyncio
+async def test_gzip_round_trips(small_chunks):
+    plain = b"".join(await _collect(ndjson_chunks(_cursor())))
+    compressed = b"".join(await _collect(gzip_chunks(ndjson_chunks(_cursor()))))
+
+    assert gzip.decompress(compressed) == plain
+    assert len(compressed) < len(plain)
@@ -0,0 +1,13 @@
+import pytest
+from asgi_lifespan import LifespanManager
+from app.main import app
+from app.core.indexes import check_query_plans
+
+
+@pytest.mark.asyncio
+async def test_repository_queries_use_indexes():
+    # startup applies the index registry
+    async with LifespanManager(app):
+        failures = await check_query_plans()
+
+    assert failures == {}
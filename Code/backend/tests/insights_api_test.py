@@ -0,0 +1,93 @@
+import uuid
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient, ASGITransport
+from asgi_lifespan import LifespanManager
+from app.main import app
+from app.services import write_behind
+from tests.intelligence_api_test import _full_payload
+
+
+def _insight(source_id, vehicle_id="TEST_CAR_001", fault_primary="BRAKE_THERMAL_SATURATION"):
+    return {
+        "source_id": source_id,
+        "vehicle_id": vehicle_id,
+        "timestamp_ms": 1707051123456,
+        "fog_decision_critical_class": 1,
+        "fog_decision_actuation_triggered": 1,
+        "fog_decision_confidence": 0.9,
+        "thermal_brake_margin": -0.21,
+        "thermal_engine_margin": 0.34,
+        "thermal_stress_index": 0.8,
+        "mechanical_vibration_anomaly_score": 0.77,
+        "mechanical_dominant_fault_band_hz": 142,
+        "mechanical_vibration_rms": 0.4,
+        "electrical_charging_efficiency_score": 0.81,
+        "electrical_battery_degradation_trend": "stable",
+        "usage_driver_aggression_score": 0.58,
+        "usage_stress_amplification_factor": 1.27,
+        "engine_rul_pct": 62,
+        "brake_rul_pct": 28,
+        "battery_rul_pct": 74,
+        "fault_primary": fault_primary,
+        "fault_contributing_factor": ["high_brake_temp_rise_rate"],
+        "fault_failure_probability": 0.61,
+        "vehicle_health_score": 0.64,
+        "recommendation_service_priority": "high",
+        "recommendation_suggested_action": "Brake inspection and pad replacement",
+        "recommendation_safe_operating_limit_km": 120,
+        "trigger_measured_brake_temp_c": 212.4,
+        "trigger_brake_temp_rise_rate": 4.1,
+        "trigger_brake_health_index": 0.32,
+        "fog_thermal_protection_active": True,
+        "fog_brake_stress_mitigation_active": True,
+        "fog_vibration_damping_mode_active": False,
+        "fog_predictive_service_required": True,
+        "fog_emergency_safeguard_active": False
+    }
+
+
+@pytest.mark.asyncio
+async def test_post_insights_batch(monkeypatch):
+    vehicle_id = f"TEST_INSIGHT_{uuid.uuid4().hex[:8]}"
+    insert_documents = write_behind.insert_documents
+
+    # the storage layer refuses one insight, as a write error inside the insert_many
+    async def refuse_one(collection, documents):
+        refused = {
+            i: {"index": i, "code": 2, "errmsg": "disk full"}
+            for i, doc in enumerate(documents) if doc.get("fault_primary") == "REFUSED"
+        }
+        await insert_documents(collection, [d for i, d in enumerate(documents) if i not in refused])
+        return refused
+
+    monkeypatch.setattr(write_behind, "insert_documents", refuse_one)
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            edge = await ac.post(
+                "/api/intelligence/insert_batch",
+                json=[_full_payload(vehicle_id, 1707051123456 + i) for i in range(2)]
+            )
+            processed_id, refused_id = [r["inserted_id"] for r in edge.json()["results"]]
+
+            response = await ac.post("/api/insights/post_insights_batch", json=[
+                _insight(processed_id, vehicle_id),
+                {"source_id": processed_id},
+                _insight("not-an-object-id", vehicle_id),
+                _insight(str(ObjectId()), vehicle_id),
+                _insight(refused_id, vehicle_id, fault_primary="REFUSED"),
+            ])
+            unprocessed = await ac.get("/api/intelligence/data/unprocessed", params={"vehicle_id": vehicle_id})
+
+    assert response.status_code == 201
+    body = response.json()
+    assert [r["index"] for r in body["results"]] == [0, 1, 2, 3, 4]
+    assert [r["status"] for r in body["results"]] == ["ok", "invalid", "invalid", "not_found", "failed"]
+    assert body["inserted"] == 1
+    # only the stored insight marks its source processed; the refused one can be retried
+    assert [r["_id"] for r in unprocessed.json()] == [refused_id]
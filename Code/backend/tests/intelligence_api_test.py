@@ -1,7 +1,14 @@
+import gzip
+import json
+import uuid
+import msgpack
 import pytest
+from bson import ObjectId
 from httpx import AsyncClient, ASGITransport
 from asgi_lifespan import LifespanManager
 from app.main import app
+from app.core.config import settings
+from app.services.write_behind import edge_state_writer
 
 
 @pytest.mark.asyncio
@@ -61,3 +68,253 @@ async def test_get_all_data():
 
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+
+
+def _full_payload(vehicle_id="TEST_CAR_001", timestamp_ms=1707051123456):
+    return {
+        "vehicle_id": vehicle_id,
+        "timestamp_ms": timestamp_ms,
+        "fog_decision_critical_class": 0,
+        "fog_decision_actuation_triggered": 0,
+        "fog_decision_confidence": 0.6,
+        "thermal_brake_margin": -0.21,
+        "thermal_engine_margin": 0.34,
+        "thermal_stress_index": 0.82,
+        "mechanical_vibration_anomaly_score": 0.77,
+        "mechanical_dominant_fault_band_hz": 142,
+        "mechanical_vibration_rms": 0.84,
+        "electrical_charging_efficiency_score": 0.81,
+        "electrical_battery_health_pct": 87,
+        "engine_rul_pct": 62,
+        "brake_rul_pct": 28,
+        "battery_rul_pct": 74,
+        "vehicle_health_score": 0.64,
+        "trigger_measured_brake_temp_c": 190.0,
+        "trigger_brake_temp_rise_rate": 3.2,
+        "trigger_brake_health_index": 0.38,
+        "fog_thermal_protection_active": False,
+        "fog_brake_stress_mitigation_active": False,
+        "fog_vibration_damping_mode_active": False,
+        "fog_predictive_service_required": False,
+        "fog_emergency_safeguard_active": False
+    }
+
+
+@pytest.mark.asyncio
+async def test_insert_vehicle_data_batch():
+    payload = [
+        _full_payload(timestamp_ms=1707051123456),
+        {"vehicle_id": "TEST_CAR_001"},
+        _full_payload(timestamp_ms=1707051124456),
+    ]
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            response = await ac.post("/api/intelligence/insert_batch", json=payload)
+
+    assert response.status_code == 201
+    body = response.json()
+    assert body["inserted"] == 2
+    assert [r["status"] for r in body["results"]] == ["ok", "invalid", "ok"]
+
+
+@pytest.mark.asyncio
+async def test_insert_batch_body_limits(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_BATCH_BYTES", 4096)
+    raw = json.dumps([_full_payload(timestamp_ms=1707051123456 + i) for i in range(20)]).encode()
+    small = json.dumps([_full_payload(timestamp_ms=1707051123456)]).encode()
+    gzip_headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            # over the cap as sent
+            too_long = await ac.post("/api/intelligence/insert_batch", content=raw, headers={"Content-Type": "application/json"})
+            # small on the wire, over the cap once decompressed
+            bomb = await ac.post("/api/intelligence/insert_batch", content=gzip.compress(b" " * 100_000), headers=gzip_headers)
+            truncated = await ac.post("/api/intelligence/insert_batch", content=gzip.compress(small)[:-8], headers=gzip_headers)
+            fits = await ac.post("/api/intelligence/insert_batch", content=gzip.compress(small), headers=gzip_headers)
+
+    assert len(raw) > 4096
+    assert too_long.status_code == 413
+    assert bomb.status_code == 413
+    assert truncated.status_code == 400
+    assert fits.status_code == 201
+    assert fits.json()["inserted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_lease_is_exclusive_between_workers():
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            await ac.post(
+                "/api/intelligence/insert_batch",
+                json=[_full_payload("TEST_LEASE_CAR", 1707051123456 + i) for i in range(4)]
+            )
+            first = await ac.post("/api/intelligence/lease", json={
+                "worker_id": "test-worker-1", "vehicle_id": "TEST_LEASE_CAR", "limit": 2
+            })
+            second = await ac.post("/api/intelligence/lease", json={
+                "worker_id": "test-worker-2", "vehicle_id": "TEST_LEASE_CAR", "limit": 2
+            })
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    first_ids = {r["_id"] for r in first.json()["records"]}
+    second_ids = {r["_id"] for r in second.json()["records"]}
+    assert first_ids.isdisjoint(second_ids)
+
+
+@pytest.mark.asyncio
+async def test_get_all_data_cursor_pagination():
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            await ac.post(
+                "/api/intelligence/insert_batch",
+                json=[_full_payload("TEST_PAGE_CAR", 1707051123456) for _ in range(3)]
+            )
+            params = {"vehicle_id": "TEST_PAGE_CAR", "limit": 2, "fields": "vehicle_health_score"}
+            first = await ac.get("/api/intelligence/data/all", params=params)
+            second = await ac.get(
+                "/api/intelligence/data/all",
+                params={**params, "cursor": first.headers["X-Next-Cursor"]}
+            )
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    first_ids = {r["_id"] for r in first.json()}
+    second_ids = {r["_id"] for r in second.json()}
+    assert len(first_ids) == 2
+    assert first_ids.isdisjoint(second_ids)
+    assert set(first.json()[0]) == {"_id", "timestamp_ms", "vehicle_health_score"}
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_ingest():
+    run = uuid.uuid4()
+    vehicle_id = f"TEST_ROLLUP_{run.hex[:8]}"
+    other_id = f"TEST_ROLLUP_{run.hex[8:16]}"
+    # a minute of its own, so fleet-wide buckets only hold this run's records
+    start_ms = 60_000 * (20_000_000 + run.int % 1_000_000)
+
+    payloads = []
+    for i in range(3):
+        payload = _full_payload(vehicle_id, start_ms + i * 1000)
+        payload["vehicle_health_score"] = 70.0 + i
+        payloads.append(payload)
+    other = _full_payload(other_id, start_ms + 5000)
+    other["vehicle_health_score"] = 60.0
+
+    window = {"granularity": "1m", "start_ms": start_ms, "end_ms": start_ms + 60_000}
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            await ac.post("/api/intelligence/insert_batch", json=[*payloads[:2], other])
+            await ac.post("/api/intelligence/insert", json=payloads[2])
+            # rollups are folded in when the write-behind batch flushes
+            await edge_state_writer.flush()
+            response = await ac.get(
+                "/api/intelligence/rollups",
+                params={**window, "vehicle_id": vehicle_id}
+            )
+            fleet = await ac.get("/api/intelligence/rollups", params=window)
+
+    assert response.status_code == 200
+    [bucket] = response.json()
+    assert bucket["count"] == 3
+    assert bucket["min"]["vehicle_health_score"] == 70.0
+    assert bucket["max"]["vehicle_health_score"] == 72.0
+    assert bucket["mean"]["vehicle_health_score"] == 71.0
+
+    [fleet_bucket] = fleet.json()
+    assert fleet_bucket["bucket_start"] == start_ms
+    assert fleet_bucket["count"] == 4
+    assert fleet_bucket["min"]["vehicle_health_score"] == 60.0
+    assert fleet_bucket["max"]["vehicle_health_score"] == 72.0
+    assert fleet_bucket["mean"]["vehicle_health_score"] == 68.25
+
+
+@pytest.mark.asyncio
+async def test_replayed_batch_is_stored_once():
+    run = uuid.uuid4()
+    vehicle_id = f"TEST_REPLAY_{run.hex[:8]}"
+    start_ms = 60_000 * (21_000_000 + run.int % 1_000_000)
+    payloads = [
+        {**_full_payload(vehicle_id, start_ms + i * 1000), "packet_id": str(ObjectId())}
+        for i in range(2)
+    ]
+    window = {"granularity": "1m", "start_ms": start_ms, "end_ms": start_ms + 60_000, "vehicle_id": vehicle_id}
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            first = await ac.post("/api/intelligence/insert_batch", json=payloads)
+            # the fog lost the response and replays the batch, plus one new packet
+            new = {**_full_payload(vehicle_id, start_ms + 2000), "packet_id": str(ObjectId())}
+            replay = await ac.post("/api/intelligence/insert_batch", json=[*payloads, new])
+            stored = await ac.get("/api/intelligence/data/all", params={"vehicle_id": vehicle_id})
+            rollups = await ac.get("/api/intelligence/rollups", params=window)
+
+    assert [r["inserted_id"] for r in first.json()["results"]] == [p["packet_id"] for p in payloads]
+    results = replay.json()["results"]
+    assert [r["status"] for r in results] == ["ok", "ok", "ok"]
+    assert [r.get("duplicate", False) for r in results] == [True, True, False]
+    assert len(stored.json()) == 3
+    [bucket] = rollups.json()
+    assert bucket["count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_insert_vehicle_data_msgpack():
+    from app.utils.wire import WIRE_SCHEMAS
+
+    payload = _full_payload("TEST_MSGPACK_CAR", 1707051123456)
+    fields = WIRE_SCHEMAS[1]["intelligence"]
+    wire = {0: 1, **{fields.index(k) + 1: v for k, v in payload.items()}}
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport,
+            base_url="http://test"
+        ) as ac:
+            response = await ac.post(
+                "/api/intelligence/insert",
+                content=msgpack.packb(wire),
+                headers={"Content-Type": "application/msgpack"}
+            )
+            bad_version = await ac.post(
+                "/api/intelligence/insert",
+                content=msgpack.packb({**wire, 0: 99}),
+                headers={"Content-Type": "application/msgpack"}
+            )
+            # the latest state is written when the write-behind batch flushes
+            await edge_state_writer.flush()
+            latest = await ac.get("/api/intelligence/data/latest/TEST_MSGPACK_CAR")
+
+    assert response.status_code == 201
+    assert bad_version.status_code == 400
+    assert latest.json()["intelligence"]["vehicle_health_score"] == payload["vehicle_health_score"]
+
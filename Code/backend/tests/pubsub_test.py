@@ -0,0 +1,67 @@
+import json
+import pytest
+from app.services.pubsub import VehicleHub
+
+
+def _drain(sub):
+    frames = []
+    while not sub.queue.empty():
+        frames.append(sub.queue.get_nowait())
+    return frames
+
+
+def _seq(frame):
+    return json.loads(frame.split("data: ", 1)[1])["seq"]
+
+
+@pytest.mark.asyncio
+async def test_fan_out_is_per_vehicle():
+    hub = VehicleHub(queue_size=10, max_drops=5)
+    car_1 = hub.subscribe({"CAR_1"})
+    both = hub.subscribe({"CAR_1", "CAR_2"})
+
+    hub.publish("CAR_1", "intelligence", {"seq": 1})
+    hub.publish("CAR_2", "actuation", {"seq": 2})
+    hub.publish("CAR_3", "intelligence", {"seq": 3})  # nobody subscribed
+
+    assert [_seq(f) for f in _drain(car_1)] == [1]
+    frames = _drain(both)
+    assert [_seq(f) for f in frames] == [1, 2]
+    assert frames[1].startswith("event: actuation\n")
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_oldest_then_disconnects():
+    hub = VehicleHub(queue_size=2, max_drops=2)
+    sub = hub.subscribe({"CAR_1"})
+
+    for seq in range(4):
+        hub.publish("CAR_1", "intelligence", {"seq": seq})
+
+    # two drops in a row: still subscribed, holding the newest frames
+    assert not sub.closed
+    assert [_seq(f) for f in _drain(sub)] == [2, 3]
+
+    for seq in range(4, 9):
+        hub.publish("CAR_1", "intelligence", {"seq": seq})
+
+    # third drop in a row: cut loose, the close marker is the last item
+    assert sub.closed
+    assert _drain(sub)[-1] is None
+    hub.publish("CAR_1", "intelligence", {"seq": 9})
+    assert sub.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_twice_is_safe():
+    hub = VehicleHub(queue_size=10, max_drops=5)
+    sub = hub.subscribe({"CAR_1", "CAR_2"})
+    other = hub.subscribe({"CAR_2"})
+
+    hub.unsubscribe(sub)
+    hub.unsubscribe(sub)
+
+    hub.publish("CAR_1", "intelligence", {"seq": 1})
+    hub.publish("CAR_2", "intelligence", {"seq": 2})
+    assert sub.queue.empty()
+    assert [_seq(f) for f in _drain(other)] == [2]
@@ -0,0 +1,52 @@
+import pytest
+from app.utils.time import BUCKET_STEPS_MS, choose_bucket_ms, bucket_start_expr
+
+DAY = 86_400_000
+WEEK = 7 * DAY
+
+
+@pytest.mark.parametrize("range_ms, max_points, expected", [
+    (300_000, 300, 1_000),          # exactly one second per point
+    (300_001, 300, 5_000),          # one ms more needs the next step
+    (0, 300, 1_000),                # empty range still gets the smallest step
+    (60_000, 0, 60_000),            # max_points below 1 is treated as 1
+    (DAY, 24, 3_600_000),
+    (DAY + 1, 24, 3 * 3_600_000),
+    (WEEK * 300, 300, WEEK),        # largest step, exactly
+    (WEEK * 300 + 1, 300, 2 * WEEK),  # past it: whole multiples of the largest step
+])
+def test_choose_bucket_ms_boundaries(range_ms, max_points, expected):
+    assert choose_bucket_ms(range_ms, max_points) == expected
+
+
+@pytest.mark.parametrize("range_ms", [1, 999, 59_999, 3 * DAY + 7, 400 * DAY])
+@pytest.mark.parametrize("max_points", [1, 7, 300, 2000])
+def test_choose_bucket_ms_stays_within_max_points(range_ms, max_points):
+    bucket_ms = choose_bucket_ms(range_ms, max_points)
+    assert bucket_ms * max_points >= range_ms
+    assert bucket_ms in BUCKET_STEPS_MS or bucket_ms % WEEK == 0
+
+
+def _evaluate(expr, doc):
+    # just enough of Mongo's expression language for bucket_start_expr
+    if isinstance(expr, str) and expr.startswith("$"):
+        return doc[expr[1:]]
+    if isinstance(expr, dict):
+        [(op, (a, b))] = expr.items()
+        a, b = _evaluate(a, doc), _evaluate(b, doc)
+        return {"$subtract": lambda: a - b, "$mod": lambda: a % b}[op]()
+    return expr
+
+
+def test_bucket_start_is_aligned_to_start_ms():
+    start_ms = 1_707_051_123_456  # deliberately not a multiple of the bucket
+    bucket_ms = 60_000
+    expr = bucket_start_expr(start_ms, bucket_ms)
+
+    def bucket(ts):
+        return _evaluate(expr, {"timestamp_ms": ts})
+
+    assert bucket(start_ms) == start_ms
+    assert bucket(start_ms + bucket_ms - 1) == start_ms
+    assert bucket(start_ms + bucket_ms) == start_ms + bucket_ms
+    assert bucket(start_ms + 5 * bucket_ms + 17) == start_ms + 5 * bucket_ms
@@ -0,0 +1,205 @@
+"""
+Micro-benchmarks for the per-tick path (25 ms budget): TelemetryBuffer.push, aggregate,
+compute_health and the packet builders, over several aggregation window sizes.
+
+    python benchmarks/hot_path.py --json results.json
+    python benchmarks/hot_path.py --baseline results.json --threshold 0.2
+
+Every case is timed REPEAT times in each of PROCESSES fresh interpreters (hash seed and
+memory layout differ per process, and shift timings by more than a single process shows),
+and reports the median, min and stdev ns per call over all those runs.
+
+With --baseline, a case is a regression only if its median and its min are both more than
+--threshold slower than the baseline's, and the median moved by more than the baseline's
+stdev. Suspects are then re-measured CONFIRM times; only a case that regresses
+every time is reported, with exit status 1. Compare runs from the same machine only.
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import argparse
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fog_node as fog
+from wire_format import sample
+
+REPEAT = 7
+MIN_RUN_SEC = 0.1
+PROCESSES = 3
+CONFIRM = 2
+SAMPLES = [sample(i) for i in range(4096)]
+
+
+def filled(window):
+    buf = fog.TelemetryBuffer(size=window)
+    for s in SAMPLES[:buf.capacity]:
+        buf.push(s)
+    return buf
+
+
+def cases(windows):
+    """name -> zero-arg callable doing one operation on warmed-up state."""
+    out = {}
+
+    for window in windows:
+        buf = filled(window)
+        feed = iter(range(1 << 62))
+        n = len(SAMPLES)
+
+        out[f"push[w={window}]"] = lambda buf=buf, feed=feed: buf.push(SAMPLES[next(feed) % n])
+        out[f"aggregate[w={window}]"] = lambda buf=buf: fog.aggregate(buf)
+
+        tick_buf = filled(window)
+        tick_feed = iter(range(1 << 62))
+
+        def tick(buf=tick_buf, feed=tick_feed):
+            buf.push(SAMPLES[next(feed) % n])
+            d = fog.aggregate(buf)
+            h = fog.compute_health(d)
+            fog.build_actuation_packet(d, h)
+            fog.build_cloud_packet(d, h)
+        out[f"tick[w={window}]"] = tick
+
+    d = fog.aggregate(filled(fog.MAX_SAMPLES))
+    h = fog.compute_health(d)
+    out["compute_health"] = lambda: fog.compute_health(d)
+    out["build_cloud_packet"] = lambda: fog.build_cloud_packet(d, h)
+    out["build_actuation_packet"] = lambda: fog.build_actuation_packet(d, h)
+    return out
+
+
+def measure(cases):
+    """name -> ns per call of each of REPEAT runs. Cases are timed round-robin, so a slow
+    patch on the machine spreads over all cases instead of landing on whichever one was running."""
+    timers = {}
+    for name, fn in cases.items():
+        timer = timeit.Timer(fn)
+        number, elapsed = timer.autorange()
+        timers[name] = (timer, max(number, int(number * MIN_RUN_SEC / max(elapsed, 1e-9))))
+
+    runs = {name: [] for name in cases}
+    for _ in range(REPEAT):
+        for name, (timer, number) in timers.items():
+            runs[name].append(timer.timeit(number) / number * 1e9)
+    return runs
+
+
+def measure_in_processes(windows, names=None, processes=PROCESSES):
+    """Pools the runs of `processes` worker interpreters, one after the other."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--windows", *map(str, windows)]
+    if names:
+        cmd += ["--cases", *names]
+
+    runs = {}
+    for _ in range(processes):
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        for name, r in json.loads(out).items():
+            runs.setdefault(name, []).extend(r)
+    return runs
+
+
+def summarise(runs):
+    return {
+        name: {
+            "median_ns": round(statistics.median(r), 1),
+            "min_ns": round(min(r), 1),
+            "stdev_ns": round(statistics.stdev(r), 1),
+            "runs": len(r),
+        }
+        for name, r in runs.items()
+    }
+
+
+def regressed(r, base, threshold):
+    limit = 1 + threshold
+    return (
+        r["median_ns"] > base["median_ns"] * limit
+        and r["min_ns"] > base["min_ns"] * limit
+        and r["median_ns"] - base["median_ns"] > base["stdev_ns"]
+    )
+
+
+def compare(results, baseline, threshold):
+    """name -> (median ratio to baseline, regressed?) for cases present in both."""
+    out = {}
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base:
+            out[name] = (r["median_ns"] / base["median_ns"], regressed(r, base, threshold))
+    return out
+
+
+def confirm(suspects, windows, baseline, threshold, processes):
+    """Re-measures suspect cases CONFIRM times; returns those that regressed every time."""
+    for _ in range(CONFIRM):
+        if not suspects:
+            break
+        again = summarise(measure_in_processes(windows, suspects, processes))
+        suspects = [name for name in suspects if regressed(again[name], baseline[name], threshold)]
+    return suspects
+
+
+def main():
+    p = argparse.ArgumentParser(description="Fog node hot-path micro-benchmarks")
+    p.add_argument("--windows", type=int, nargs="+", default=[fog.MAX_SAMPLES, 200, 1000],
+                   help="aggregation window sizes (samples)")
+    p.add_argument("--json", default=None, help="write results here")
+    p.add_argument("--baseline", default=None, help="results JSON from an earlier run to compare against")
+    p.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    p.add_argument("--processes", type=int, default=PROCESSES, help="worker interpreters per measurement")
+    p.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--cases", nargs="+", default=None, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.worker:
+        selected = cases(args.windows)
+        if args.cases:
+            selected = {name: selected[name] for name in args.cases}
+        json.dump(measure(selected), sys.stdout)
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = summarise(measure_in_processes(args.windows, processes=args.processes))
+    deltas = compare(results, baseline, args.threshold) if baseline else {}
+
+    print(f"{'case':<26}{'median ns':>12}{'min ns':>12}{'vs baseline':>13}")
+    for name, r in results.items():
+        ratio, bad = deltas.get(name, (None, False))
+        vs = f"{ratio - 1:+.1%}{' !' if bad else ''}" if ratio else ""
+        print(f"{name:<26}{r['median_ns']:>12}{r['min_ns']:>12}{vs:>13}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "python": platform.python_version(),
+                    "implementation": platform.python_implementation(),
+                    "machine": platform.machine(),
+                    "platform": platform.platform(),
+                    "sample_period_ms": fog.SAMPLE_PERIOD * 1000,
+                },
+                "results": results,
+            }, f, indent=2)
+
+    suspects = [name for name, (_, bad) in deltas.items() if bad]
+    regressions = confirm(suspects, args.windows, baseline, args.threshold, args.processes)
+    if suspects and not regressions:
+        print(f"\nnot confirmed on re-run: {', '.join(suspects)}")
+    if regressions:
+        print(f"\nREGRESSION (> {args.threshold:.0%} slower): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+JSON vs msgpack uplink encoding: bytes on the wire and encode / decode CPU,
+for single packets and for a gzip'd DRAIN_BATCH as sent to /insert_batch.
+
+    python benchmarks/wire_format.py
+"""
+import os
+import sys
+import gzip
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fog_node as fog
+
+REPEAT = 2000
+
+
+def sample(i):
+    return {
+        "device_id": "esp32-01", "vehicle_id": "VH-000123", "timestamp_ms": 1707051123456 + i*25,
+        "brake_temp_c": 180.0 + (i % 40)*0.7, "engine_oil_temp_c": 92.4, "motor_rpm": 3120,
+        "vibration_rms": 0.48 + (i % 7)*0.01, "dominant_vibration_hz": 61,
+        "battery_voltage_v": 12.6, "output_voltage_v": 13.8, "battery_health_pct": 91,
+        "engine_rul_pct": 72, "brake_rul_pct": 48, "battery_rul_pct": 83,
+        "brake_pad_remaining_pct": 22.5, "brake_disc_score": 0.21,
+    }
+
+
+def packets(n):
+    buf = fog.TelemetryBuffer()
+    health, actuation = [], []
+    for i in range(n + fog.MAX_SAMPLES):
+        buf.push(sample(i))
+        if buf.full():
+            d = fog.aggregate(buf)
+            h = fog.compute_health(d)
+            health.append(fog.build_cloud_packet(d, h))
+            actuation.append(fog.build_actuation_packet(d, h))
+    return health[:n], actuation[:n]
+
+
+def from_wire(kind, m):
+    fields = fog.WIRE_FIELDS[kind]
+    return {fields[k-1] if isinstance(k, int) else k: v for k, v in m.items() if k != 0}
+
+
+def decode(kind, body, fmt):
+    if fmt == "msgpack":
+        obj = fog.msgpack.unpackb(body, strict_map_key=False)
+        if isinstance(obj, list):
+            return [from_wire(kind, m) for m in obj]
+        return from_wire(kind, obj)
+    return json.loads(body)
+
+
+def usec(fn):
+    return min(timeit.repeat(fn, number=REPEAT, repeat=3)) / REPEAT * 1e6
+
+
+def measure(kind, obj, batch):
+    rows = {}
+    for fmt in ("json", "msgpack"):
+        body, _ = fog.encode(kind, obj, fmt)
+        assert decode(kind, body, fmt) == obj
+        wire = gzip.compress(body) if batch else body
+        rows[fmt] = (
+            len(wire),
+            usec(lambda: gzip.compress(fog.encode(kind, obj, fmt)[0]) if batch else fog.encode(kind, obj, fmt)),
+            usec(lambda: decode(kind, gzip.decompress(wire) if batch else wire, fmt)),
+        )
+    return rows
+
+
+def main():
+    if fog.msgpack is None:
+        sys.exit("msgpack is not installed")
+
+    health, actuation = packets(fog.DRAIN_BATCH)
+    cases = [
+        ("health packet", "health", health[-1], False),
+        ("actuation packet", "actuation", actuation[-1], False),
+        (f"health batch x{fog.DRAIN_BATCH} (gzip)", "health", health, True),
+    ]
+
+    print(f"{'case':<28}{'format':<9}{'bytes':>8}{'encode us':>11}{'decode us':>11}")
+    for name, kind, obj, batch in cases:
+        rows = measure(kind, obj, batch)
+        for fmt, (size, enc, dec) in rows.items():
+            print(f"{name:<28}{fmt:<9}{size:>8}{enc:>11.1f}{dec:>11.1f}")
+        js, mp = rows["json"], rows["msgpack"]
+        print(f"{'':<28}{'saved':<9}{1 - mp[0]/js[0]:>8.0%}{1 - mp[1]/js[1]:>11.0%}{1 - mp[2]/js[2]:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
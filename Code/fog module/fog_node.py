@@ -1,8 +1,22 @@
+import os
+import gzip
+import json
 import time
+import math
+import queue
+import asyncio
+import sqlite3
 import requests
 import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from collections import deque
-from statistics import mean, variance
+from itertools import chain
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # ============================================================
 # CONFIG
@@ -12,11 +26,71 @@ SAMPLE_PERIOD = 0.025
 WINDOW_SEC = 1.0
 MAX_SAMPLES = int(WINDOW_SEC / SAMPLE_PERIOD)
 
+# raw samples kept on the node for trend features (the aggregation window is the newest MAX_SAMPLES)
+HISTORY_SEC = 120.0
+HISTORY_SAMPLES = int(HISTORY_SEC / SAMPLE_PERIOD)
+
 BRAKE_MAX_TEMP = 220.0
 MAX_SAFE_RISE = 6.0
 
+# normal telemetry is considered once per CLOUD_PERIOD. "periodic" sends every time;
+# "deadband" only when a DEADBANDS field moved further than its band from the last packet
+# sent, or after HEARTBEAT_SEC without one. Packets carry the decision as send_reason.
+UPLINK_POLICY = "periodic"
+CLOUD_PERIOD = 1.0
+HEARTBEAT_SEC = 30.0
+DEADBANDS = {
+    "thermal_brake_margin": 0.02,
+    "thermal_engine_margin": 0.02,
+    "thermal_stress_index": 0.05,
+    "mechanical_vibration_anomaly_score": 0.05,
+    "mechanical_dominant_fault_band_hz": 2,
+    "mechanical_vibration_rms": 0.05,
+    "electrical_charging_efficiency_score": 0.02,
+    "electrical_battery_health_pct": 1,
+    "engine_rul_pct": 1,
+    "brake_rul_pct": 1,
+    "battery_rul_pct": 1,
+    "vehicle_health_score": 0.02,
+}
+
 ESP32_IP = "10.213.19.38"
-CLOUD_URL = "https://fog-based-vehicle-monitoring.onrender.com/api/intelligence/insert"
+CLOUD_BATCH_URL = "https://fog-based-vehicle-monitoring.onrender.com/api/intelligence/insert_batch"
+ACTUATION_BATCH_URL = "https://fog-based-vehicle-monitoring.onrender.com/api/actuation_events/insert_batch"
+
+ESP32_TIMEOUT = 0.3
+CLOUD_TIMEOUT = 2
+
+# "json", or "msgpack": int-keyed binary packets to the cloud (see WIRE FORMAT), and ask the
+# ESP32 for msgpack samples (it may still answer JSON). Needs the msgpack package.
+WIRE_FORMAT = "json"
+
+# "threads": one thread per pipeline stage; "asyncio": single event loop + IO pool;
+# "gateway": the asyncio runtime polling every ESP32 in ESP32_DEVICES (None: just ESP32_IP)
+RUNTIME = "threads"
+IO_WORKERS = 8
+ESP32_DEVICES = None
+ACTUATION_INFLIGHT = 2
+
+# pipeline queue sizes; a full queue drops its oldest item instead of blocking the producer
+SAMPLE_QUEUE = 8
+ACTUATION_QUEUE = 4
+UPLINK_QUEUE = 64
+
+# per-stage latency budgets (seconds) used for the missed-deadline counters
+ACTUATION_DEADLINE = 0.1
+UPLINK_DEADLINE = 2.0
+STATS_LOG_SEC = 10.0
+
+# store-and-forward outbox for cloud packets (Chaquopy points HOME at the app files dir)
+OUTBOX_PATH = os.path.join(os.path.expanduser("~"), "fog_outbox.db")
+OUTBOX_MAX_ROWS = 50000
+OUTBOX_MAX_AGE_SEC = 24*3600
+DRAIN_BATCH = 50
+# a woken drainer waits this long first so packets from other ticks/devices share its request
+UPLINK_LINGER_SEC = 0.2
+RETRY_MIN_SEC = 1.0
+RETRY_MAX_SEC = 60.0
 
 # ============================================================
 # UTILS
@@ -26,65 +100,218 @@ def clamp(x, lo=0.0, hi=1.0):
     return max(lo, min(hi, x))
 
 
+# ============================================================
+# ROLLING STATS
+# ============================================================
+
+# fields aggregated over the window; everything else is taken from the last sample
+STAT_FIELDS = (
+    "brake_temp_c",
+    "engine_oil_temp_c",
+    "motor_rpm",
+    "vibration_rms",
+    "dominant_vibration_hz",
+    "battery_voltage_v",
+    "output_voltage_v",
+)
+MAX_FIELDS = ("brake_temp_c",)
+
+
+class RollingStat:
+    """Running sum / sum of squares over a sliding window, O(1) per sample.
+
+    Max is kept with a monotonic deque of (seq, value) so eviction never rescans.
+    """
+
+    def __init__(self, track_max=False):
+        self.n = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.peak = deque() if track_max else None
+
+    def add(self, seq, x):
+        self.n += 1
+        self.total += x
+        self.total_sq += x*x
+        if self.peak is not None:
+            while self.peak and self.peak[-1][1] <= x:
+                self.peak.pop()
+            self.peak.append((seq, x))
+
+    def remove(self, seq, x):
+        self.n -= 1
+        self.total -= x
+        self.total_sq -= x*x
+        if self.peak and self.peak[0][0] == seq:
+            self.peak.popleft()
+
+    def resync(self, segments):
+        # cancel float drift from long add/remove chains
+        self.total = math.fsum(chain(*segments))
+        self.total_sq = math.fsum(v*v for v in chain(*segments))
+
+    def mean(self):
+        return self.total/self.n
+
+    def variance(self):
+        # sample variance, same as statistics.variance
+        if self.n < 2:
+            return 0
+        return max(0.0, (self.total_sq - self.total*self.total/self.n)/(self.n-1))
+
+    def rms(self):
+        return (self.total_sq/self.n)**0.5
+
+    def max(self):
+        return self.peak[0][1]
+
+
 # ============================================================
 # BUFFER
 # ============================================================
 
+# one preallocated typed column per ESP32 field
+COLUMNS = {
+    "timestamp_ms": "q",
+    "brake_temp_c": "d",
+    "engine_oil_temp_c": "d",
+    "motor_rpm": "d",
+    "vibration_rms": "d",
+    "dominant_vibration_hz": "d",
+    "battery_voltage_v": "d",
+    "output_voltage_v": "d",
+    "battery_health_pct": "d",
+    "engine_rul_pct": "d",
+    "brake_rul_pct": "d",
+    "battery_rul_pct": "d",
+    "brake_pad_remaining_pct": "d",
+    "brake_disc_score": "d",
+}
+CASTS = {"q": int, "d": float}
+
+
 class TelemetryBuffer:
-    def __init__(self):
-        self.samples = deque(maxlen=MAX_SAMPLES)
+    """Columnar ring buffer: samples are written in place by index, nothing is allocated per push.
+
+    `size` is the aggregation window, `history` how many samples stay readable through window().
+    """
+
+    def __init__(self, size=MAX_SAMPLES, history=HISTORY_SAMPLES):
+        self.size = size
+        self.capacity = max(size, history)
+        self.cols = {k: array(t, [0])*self.capacity for k, t in COLUMNS.items()}
+        self.seq = 0
+        self.device_id = None
+        self.vehicle_id = None
+        self.stats = {k: RollingStat(k in MAX_FIELDS) for k in STAT_FIELDS}
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
 
     def push(self, sample):
-        if sample:
-            self.samples.append(sample)
+        if not sample:
+            return
+
+        # convert the whole row before touching columns or stats: a missing or non-numeric
+        # field raises (KeyError/TypeError/ValueError) and leaves the buffer as it was
+        row = {k: CASTS[t](sample[k]) for k, t in COLUMNS.items()}
+        device_id = sample["device_id"]
+        vehicle_id = sample["vehicle_id"]
+
+        if self.seq >= self.size:
+            old_seq = self.seq - self.size
+            i = old_seq % self.capacity
+            for k, st in self.stats.items():
+                st.remove(old_seq, self.cols[k][i])
+
+        i = self.seq % self.capacity
+        for k, col in self.cols.items():
+            col[i] = row[k]
+        for k, st in self.stats.items():
+            st.add(self.seq, row[k])
+
+        self.device_id = device_id
+        self.vehicle_id = vehicle_id
+        self.seq += 1
+
+        # amortised O(1): one exact recompute per window turnover
+        if self.seq % self.size == 0:
+            for k, st in self.stats.items():
+                st.resync(self.window(k))
 
     def full(self):
-        return len(self.samples) == MAX_SAMPLES
+        return self.seq >= self.size
+
+    def latest(self, k):
+        return self.cols[k][(self.seq - 1) % self.capacity]
+
+    def oldest(self, k):
+        # oldest sample still inside the aggregation window
+        return self.cols[k][(self.seq - min(self.seq, self.size)) % self.capacity]
+
+    def window(self, k, n=None):
+        """Newest n samples of column k (default: the aggregation window), oldest first.
+
+        Returned as one or two zero-copy memoryviews, since the range may wrap the ring;
+        numpy.frombuffer() accepts either directly.
+        """
+        n = min(n or self.size, len(self))
+        mv = memoryview(self.cols[k])
+        start = (self.seq - n) % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            return (mv[start:end],)
+        return (mv[start:], mv[:end - self.capacity])
 
     def all(self):
-        return list(self.samples)
+        # rebuilds per-sample dicts for the window; debugging only, O(window)
+        cols = {k: list(chain(*self.window(k))) for k in COLUMNS}
+        n = min(self.seq, self.size)
+        return [
+            {"device_id": self.device_id, "vehicle_id": self.vehicle_id,
+             **{k: v[j] for k, v in cols.items()}}
+            for j in range(n)
+        ]
 
 
 # ============================================================
 # AGGREGATION
 # ============================================================
 
-def aggregate(samples):
-    s = lambda k: [x[k] for x in samples]
-    last = samples[-1]
+def aggregate(buf):
+    st = buf.stats
+    last = buf.latest
 
-    t0 = samples[0]["timestamp_ms"]
-    t1 = samples[-1]["timestamp_ms"]
+    t0 = buf.oldest("timestamp_ms")
+    t1 = last("timestamp_ms")
     dt = (t1 - t0) / 1000.0 if t1 != t0 else 1.0
 
-    rpm_series = s("motor_rpm")
-
     return {
-        "device_id": last["device_id"],
-        "vehicle_id": last["vehicle_id"],
+        "device_id": buf.device_id,
+        "vehicle_id": buf.vehicle_id,
         "timestamp_ms": t1,
 
-        "brake_temp_c": max(s("brake_temp_c")),
-        "brake_temp_rise_rate": (samples[-1]["brake_temp_c"] - samples[0]["brake_temp_c"]) / dt,
+        "brake_temp_c": st["brake_temp_c"].max(),
+        "brake_temp_rise_rate": (last("brake_temp_c") - buf.oldest("brake_temp_c")) / dt,
 
-        "engine_oil_temp_c": mean(s("engine_oil_temp_c")),
+        "engine_oil_temp_c": st["engine_oil_temp_c"].mean(),
 
-        "motor_rpm": mean(rpm_series),
-        "engine_rpm_variance": variance(rpm_series) if len(rpm_series) > 1 else 0,
+        "motor_rpm": st["motor_rpm"].mean(),
+        "engine_rpm_variance": st["motor_rpm"].variance(),
 
-        "vibration_rms": (sum(v*v for v in s("vibration_rms"))/len(samples))**0.5,
-        "dominant_vibration_hz": mean(s("dominant_vibration_hz")),
+        "vibration_rms": st["vibration_rms"].rms(),
+        "dominant_vibration_hz": st["dominant_vibration_hz"].mean(),
 
-        "battery_voltage_v": mean(s("battery_voltage_v")),
-        "output_voltage_v": mean(s("output_voltage_v")),
-        "battery_health_pct": last["battery_health_pct"],
+        "battery_voltage_v": st["battery_voltage_v"].mean(),
+        "output_voltage_v": st["output_voltage_v"].mean(),
+        "battery_health_pct": last("battery_health_pct"),
 
-        "engine_rul_pct": last["engine_rul_pct"],
-        "brake_rul_pct": last["brake_rul_pct"],
-        "battery_rul_pct": last["battery_rul_pct"],
+        "engine_rul_pct": last("engine_rul_pct"),
+        "brake_rul_pct": last("brake_rul_pct"),
+        "battery_rul_pct": last("battery_rul_pct"),
 
-        "brake_pad_remaining_pct": last["brake_pad_remaining_pct"],
-        "brake_disc_score": last["brake_disc_score"]
+        "brake_pad_remaining_pct": last("brake_pad_remaining_pct"),
+        "brake_disc_score": last("brake_disc_score")
     }
 
 
@@ -142,13 +369,9 @@ def compute_health(d):
 # PACKETS
 # ============================================================
 
-def build_actuation_packet(d,h):
-
+def decision_fields(d, h):
+    # the fog's decision and what triggered it; carried by both actuation and cloud packets
     return {
-        "timestamp_ms": d["timestamp_ms"],
-        "decision_origin": "fog_node",
-        "cloud_dependency": False,
-
         "trigger_measured_brake_temp_c": d["brake_temp_c"],
         "trigger_brake_temp_rise_rate": d["brake_temp_rise_rate"],
         "trigger_brake_health_index": h["brake_health"],
@@ -164,6 +387,22 @@ def build_actuation_packet(d,h):
         "fog_emergency_safeguard_active": h["emergency"]
     }
 
+def new_packet_id():
+    # ObjectId layout (4-byte seconds + 8 random bytes): the backend stores it as _id, so a
+    # packet replayed from the outbox after a lost response is stored only once
+    return f"{int(time.time()):08x}{os.urandom(8).hex()}"
+
+def build_actuation_packet(d,h):
+
+    return {
+        "packet_id": new_packet_id(),
+        "vehicle_id": d["vehicle_id"],
+        "timestamp_ms": d["timestamp_ms"],
+        "decision_origin": "fog_node",
+        "cloud_dependency": False,
+        **decision_fields(d, h)
+    }
+
 def build_cloud_packet(d, h):
 
     brake_margin = clamp((BRAKE_MAX_TEMP - d["brake_temp_c"]) / BRAKE_MAX_TEMP)
@@ -176,6 +415,7 @@ def build_cloud_packet(d, h):
     vibration_anomaly = clamp(vibration_ratio/2.5)
 
     return {
+        "packet_id": new_packet_id(),
         "vehicle_id": d["vehicle_id"],
         "timestamp_ms": d["timestamp_ms"],
 
@@ -184,79 +424,768 @@ def build_cloud_packet(d, h):
         "thermal_stress_index": h["thermal_stress"],
 
         "mechanical_vibration_anomaly_score": vibration_anomaly,
-        "mechanical_dominant_fault_band_hz": d["dominant_vibration_hz"],
+        # integer fields of the backend's IntelligencePayload
+        "mechanical_dominant_fault_band_hz": round(d["dominant_vibration_hz"]),
         "mechanical_vibration_rms": d["vibration_rms"],
 
         "electrical_charging_efficiency_score": charging_efficiency,
-        "electrical_battery_health_pct": d["battery_health_pct"],
+        "electrical_battery_health_pct": round(d["battery_health_pct"]),
 
-        "engine_rul_pct": d["engine_rul_pct"],
-        "brake_rul_pct": d["brake_rul_pct"],
-        "battery_rul_pct": d["battery_rul_pct"],
+        "engine_rul_pct": round(d["engine_rul_pct"]),
+        "brake_rul_pct": round(d["brake_rul_pct"]),
+        "battery_rul_pct": round(d["battery_rul_pct"]),
 
-        "vehicle_health_score": h["vehicle_health"]
+        "vehicle_health_score": h["vehicle_health"],
+
+        **decision_fields(d, h)
     }
 
+# ============================================================
+# WIRE FORMAT
+# ============================================================
+
+MSGPACK_TYPE = "application/msgpack"
+
+# Field id n of a packet kind is WIRE_FIELDS[kind][n-1]; key 0 carries WIRE_VERSION.
+# Copy of WIRE_SCHEMAS in the backend's app/utils/wire.py - versions are frozen once shipped,
+# new fields go in a new version that extends the tuple. Keys outside the schema are sent by name.
+WIRE_VERSION = 3
+WIRE_FIELDS = {
+    "health": (
+        "vehicle_id", "timestamp_ms",
+        "fog_decision_critical_class", "fog_decision_actuation_triggered", "fog_decision_confidence",
+        "thermal_brake_margin", "thermal_engine_margin", "thermal_stress_index",
+        "mechanical_vibration_anomaly_score", "mechanical_dominant_fault_band_hz", "mechanical_vibration_rms",
+        "electrical_charging_efficiency_score", "electrical_battery_health_pct",
+        "engine_rul_pct", "brake_rul_pct", "battery_rul_pct",
+        "vehicle_health_score",
+        "trigger_measured_brake_temp_c", "trigger_brake_temp_rise_rate", "trigger_brake_health_index",
+        "fog_thermal_protection_active", "fog_brake_stress_mitigation_active",
+        "fog_vibration_damping_mode_active", "fog_predictive_service_required",
+        "fog_emergency_safeguard_active",
+        # v2
+        "send_reason",
+        # v3
+        "packet_id",
+    ),
+    "actuation": (
+        "vehicle_id", "timestamp_ms", "decision_origin", "cloud_dependency",
+        "trigger_measured_brake_temp_c", "trigger_brake_temp_rise_rate", "trigger_brake_health_index",
+        "fog_decision_critical_class", "fog_decision_actuation_triggered", "fog_decision_confidence",
+        "fog_thermal_protection_active", "fog_brake_stress_mitigation_active",
+        "fog_vibration_damping_mode_active", "fog_predictive_service_required",
+        "fog_emergency_safeguard_active",
+        # v3
+        "packet_id",
+    ),
+}
+WIRE_IDS = {kind: {name: i+1 for i, name in enumerate(fields)} for kind, fields in WIRE_FIELDS.items()}
+
+def to_wire(kind, pkt):
+    ids = WIRE_IDS[kind]
+    m = {0: WIRE_VERSION}
+    for k, v in pkt.items():
+        m[ids.get(k, k)] = v
+    return m
+
+def encode(kind, obj, fmt=None):
+    """Packet (or list of packets) -> (body bytes, content type) in the configured wire format."""
+    if (fmt or WIRE_FORMAT) == "msgpack":
+        if isinstance(obj, list):
+            return msgpack.packb([to_wire(kind, p) for p in obj]), MSGPACK_TYPE
+        return msgpack.packb(to_wire(kind, obj)), MSGPACK_TYPE
+    return json.dumps(obj, separators=(",", ":")).encode(), "application/json"
+
+def decode_sample(r):
+    if r.headers.get("Content-Type", "").startswith(MSGPACK_TYPE):
+        return msgpack.unpackb(r.content)
+    return r.json()
+
+
 # ============================================================
 # NETWORK
 # ============================================================
 
-def get_data_from_esp32():
+_local = threading.local()
+
+def http():
+    # one keep-alive session per thread: reuses TCP/TLS connections, never shared across threads
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+def esp32_headers():
+    # built per call: WIRE_FORMAT may be changed after import (loadgen, tests)
+    return {"Accept": f"{MSGPACK_TYPE}, application/json"} if WIRE_FORMAT == "msgpack" else {}
+
+# ESP32_IP is read per call rather than bound as a default, so it can be changed after import
+
+def get_data_from_esp32(ip=None):
+    ip = ip or ESP32_IP
     try:
-        return requests.get(f"http://{ESP32_IP}/data", timeout=0.3).json()
+        return decode_sample(http().get(f"http://{ip}/data", headers=esp32_headers(), timeout=ESP32_TIMEOUT))
     except:
         return None
 
-def send_to_esp32(pkt):
+def send_to_esp32(pkt, ip=None):
+    ip = ip or ESP32_IP
     try:
-        requests.put(f"http://{ESP32_IP}/actuate", json=pkt, timeout=0.3)
+        http().put(f"http://{ip}/actuate", json=pkt, timeout=ESP32_TIMEOUT)
     except:
         pass
 
-def send_to_backend(pkt):
+def send_batch_to_backend(pkts, url=None, kind="health"):
+    """One gzip'd POST to an /insert_batch endpoint. Returns a done-flag per packet, or None if the request
+    should be retried (5xx, 408/429, timeouts, connection errors)."""
+    body, content_type = encode(kind, pkts)
     try:
-        r = requests.post(CLOUD_URL, json=pkt, timeout=2)
-        if r.status_code != 200:
-            print("Cloud rejected:", r.status_code, r.text[:120])
+        r = http().post(
+            url or uplink_urls()[kind],
+            data=gzip.compress(body),
+            headers={"Content-Type": content_type, "Content-Encoding": "gzip"},
+            timeout=CLOUD_TIMEOUT
+        )
     except Exception as e:
         print("Cloud send failed:", e)
+        return None
+
+    if r.status_code >= 300:
+        print("Cloud rejected batch:", r.status_code, r.text[:120])
+        # a 4xx won't get better by replaying it, except timeouts and rate limiting:
+        # drop the batch instead of retrying it at the head of the outbox forever
+        if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+            REJECTED[kind] += len(pkts)
+            return [True]*len(pkts)
+        return None
+
+    try:
+        results = r.json()["results"]
+        statuses = [res["status"] for res in results]
+    except (ValueError, KeyError, TypeError) as e:
+        print("Cloud sent an unreadable batch response:", repr(e), r.text[:120])
+        return None
+    # results are matched to packets by position, so a short or long list can't be trusted
+    if len(statuses) != len(pkts):
+        print(f"Cloud answered {len(statuses)} results for {len(pkts)} {kind} packets")
+        return None
+
+    # "invalid" items won't pass on replay either; only "failed" ones are retried
+    invalid = [res for res in results if res["status"] == "invalid"]
+    if invalid:
+        REJECTED[kind] += len(invalid)
+        print(f"Cloud rejected {len(invalid)}/{len(results)} {kind} packets:", str(invalid[0].get("detail"))[:200])
+    return [status != "failed" for status in statuses]
+
+# packets the backend refused as invalid, per kind: dropped, never replayed
+REJECTED = {"health": 0, "actuation": 0}
+
+def uplink_urls():
+    """Batch endpoint per outbox packet kind; each kind is drained by its own thread."""
+    return {
+        "health": CLOUD_BATCH_URL,
+        "actuation": ACTUATION_BATCH_URL,
+    }
+
 
 # ============================================================
-# MAIN LOOP
+# OUTBOX
 # ============================================================
 
-def main_loop():
+class Outbox:
+    """Durable FIFO of cloud packets (SQLite, WAL). Bounded by OUTBOX_MAX_ROWS and OUTBOX_MAX_AGE_SEC;
+    the oldest packets are discarded first."""
+
+    def __init__(self, path=None, max_rows=OUTBOX_MAX_ROWS, max_age=OUTBOX_MAX_AGE_SEC):
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path or OUTBOX_PATH, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, created REAL NOT NULL, body TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS outbox_kind ON outbox (kind, id)")
+        self.puts = 0
+
+    def put(self, kind, pkt):
+        self.put_many([(kind, pkt)])
+
+    def put_many(self, items):
+        """Append (kind, packet) pairs in one transaction."""
+        now = time.time()
+        rows = [(kind, now, json.dumps(pkt, separators=(",", ":"))) for kind, pkt in items]
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                self.db.executemany("INSERT INTO outbox (kind, created, body) VALUES (?, ?, ?)", rows)
+                self.db.execute("COMMIT")
+            except:
+                self.db.execute("ROLLBACK")
+                raise
+            before = self.puts
+            self.puts += len(rows)
+            if before // 100 != self.puts // 100:
+                self._trim()
+
+    def _trim(self):
+        self.db.execute("DELETE FROM outbox WHERE created < ?", (time.time() - self.max_age,))
+        self.db.execute(
+            "DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY id DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,)
+        )
+
+    def peek(self, n, kind=None):
+        with self.lock:
+            if kind:
+                rows = self.db.execute(
+                    "SELECT id, kind, created, body FROM outbox WHERE kind = ? ORDER BY id LIMIT ?", (kind, n)
+                ).fetchall()
+            else:
+                rows = self.db.execute(
+                    "SELECT id, kind, created, body FROM outbox ORDER BY id LIMIT ?", (n,)
+                ).fetchall()
+        return [(i, kind, created, json.loads(body)) for i, kind, created, body in rows]
+
+    def ack(self, ids):
+        if not ids:
+            return
+        with self.lock:
+            self.db.execute(
+                f"DELETE FROM outbox WHERE id IN ({','.join('?'*len(ids))})", ids
+            )
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+
+def send_batch(kind, batch):
+    """Deliver outbox rows of one kind in a single /insert_batch request; returns the ids that are done."""
+    flags = send_batch_to_backend([pkt for _, _, _, pkt in batch], kind=kind)
+    if flags is None:
+        return []
+
+    done = []
+    for (i, _, created, _), ok in zip(batch, flags):
+        if ok:
+            done.append(i)
+            STATS["uplink"].record(time.time()-created)
+    return done
+
+
+UPLINK_ERRORS = 0
+
+def uplink_error(where, e):
+    global UPLINK_ERRORS
+    UPLINK_ERRORS += 1
+    if UPLINK_ERRORS == 1 or UPLINK_ERRORS % 100 == 0:
+        print(f"{where} failed (#{UPLINK_ERRORS}):", repr(e))
+
+
+def outbox_writer(jobs, outbox, wake):
+    """Moves packets from the uplink queue into the outbox and never touches the network,
+    so a slow or dead link can't back the queue up into dropping packets."""
+
+    items=[]
 
-    buffer=TelemetryBuffer()
-    next_tick=time.monotonic()
-    last_cloud=time.monotonic()
+    while True:
+        # items left over from a failed write are retried first
+        if not items:
+            items=[jobs.get()]
+        try:
+            while len(items)<DRAIN_BATCH:
+                items.append(jobs.get(timeout=0))
+        except queue.Empty:
+            pass
+
+        try:
+            outbox.put_many(items)
+        except Exception as e:
+            # e.g. disk full or a locked database: keep the packets and try again
+            uplink_error("Outbox write", e)
+            time.sleep(RETRY_MIN_SEC)
+            continue
+
+        for kind in {kind for kind, _ in items}:
+            wake[kind].set()
+        items=[]
+
+
+def uplink_drainer(kind, outbox, wake):
+    """Replays one kind of packet from the outbox, DRAIN_BATCH per request, back to back
+    until the backlog is empty; retries back off while the backend is unreachable."""
+
+    retry_in=0.0
 
     while True:
 
-        raw=get_data_from_esp32()
-        buffer.push(raw)
+        wake.wait()
+        # packets from other ticks/devices arriving meanwhile share the request
+        time.sleep(UPLINK_LINGER_SEC)
+        wake.clear()
+
+        while True:
+            try:
+                batch=outbox.peek(DRAIN_BATCH, kind)
+                if not batch:
+                    break
+                done=send_batch(kind, batch)
+                outbox.ack(done)
+                backlog=len(done)<len(batch)
+            except Exception as e:
+                # an exception here would end the drainer and leave the outbox growing
+                uplink_error(f"Uplink {kind}", e)
+                backlog=True
+
+            if backlog:
+                retry_in=min(RETRY_MAX_SEC, max(RETRY_MIN_SEC, 2*retry_in))
+                time.sleep(retry_in)
+            else:
+                retry_in=0.0
+
+
+# ============================================================
+# PIPELINE
+# ============================================================
 
-        if buffer.full():
+class DropQueue:
+    """Bounded hand-off between stages. put() never blocks: when full, the oldest item
+    is overwritten (or the new one discarded with overwrite=False) and counted as dropped."""
+
+    def __init__(self, maxsize, overwrite=True):
+        self.q = queue.Queue(maxsize)
+        self.overwrite = overwrite
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self.q.put_nowait(item)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if not self.overwrite:
+                    return
+                try:
+                    self.q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        return self.q.get(timeout=timeout)
+
+    def qsize(self):
+        return self.q.qsize()
+
+
+class StageStats:
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.missed = 0
+
+    def record(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.worst = max(self.worst, seconds)
+            if seconds > self.deadline:
+                self.missed += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "avg_ms": round(1000*self.total/self.count, 3) if self.count else 0.0,
+                "max_ms": round(1000*self.worst, 3),
+                "missed": self.missed,
+                "deadline_ms": 1000*self.deadline
+            }
+
+
+# sample:    ESP32 poll duration
+# process:   sample hand-off + aggregation + health decision
+# actuation: sample received -> /actuate acknowledged
+# uplink:    packet queued -> backend accepted (includes time spent in the outbox)
+STATS = {
+    "sample": StageStats(SAMPLE_PERIOD),
+    "process": StageStats(SAMPLE_PERIOD),
+    "actuation": StageStats(ACTUATION_DEADLINE),
+    "uplink": StageStats(UPLINK_DEADLINE),
+}
+
+QUEUES = {
+    "samples": DropQueue(SAMPLE_QUEUE),
+    "actuation": DropQueue(ACTUATION_QUEUE),
+    "uplink": DropQueue(UPLINK_QUEUE),
+}
+
+
+OUTBOX = None
+POLICY = None
+BAD_SAMPLES = 0
+
+
+def pipeline_stats():
+    # threads runtime: STATS / POLICY; asyncio runtime: per-device stats in DEVICES
+    stats = {
+        "stages": {k: st.snapshot() for k, st in STATS.items()},
+        "queues": {k: {"depth": q.qsize(), "dropped": q.dropped} for k, q in QUEUES.items()},
+        "outbox": len(OUTBOX) if OUTBOX else 0,
+        "rejected": dict(REJECTED),
+        "uplink_errors": UPLINK_ERRORS,
+        "send_reasons": dict(POLICY.counts) if POLICY else {},
+        "bad_samples": BAD_SAMPLES
+    }
+    if DEVICES:
+        stats["devices"] = {dev.key: dev.snapshot() for dev in DEVICES.values()}
+    return stats
 
-            agg=aggregate(buffer.all())
-            health=compute_health(agg)
 
-            # ---- ACTUATION PATH ----
-            if health["actuation"]:
-                send_to_esp32(build_actuation_packet(agg,health))
-                send_to_backend(build_cloud_packet(agg,health))
-                last_cloud=time.monotonic()
+def sampler(samples):
 
-            # ---- NORMAL TELEMETRY ----
-            elif time.monotonic()-last_cloud>=1:
-                send_to_backend(build_cloud_packet(agg,health))     
-                last_cloud=time.monotonic()
+    next_tick=time.monotonic()
+
+    while True:
+
+        t=time.monotonic()
+        raw=get_data_from_esp32()
+        now=time.monotonic()
+        STATS["sample"].record(now-t)
+
+        if raw:
+            samples.put((now, raw))
 
         next_tick+=SAMPLE_PERIOD
         sleep=next_tick-time.monotonic()
         if sleep>0:
             time.sleep(sleep)
+        elif sleep<-SAMPLE_PERIOD:
+            # fell more than a tick behind (slow ESP32): skip the missed ticks, don't burst
+            next_tick=time.monotonic()
+
+
+class UplinkPolicy:
+    """Which health packets go to the cloud, and why (see UPLINK_POLICY). Deadbands are measured
+    against the last packet actually sent, so slow drift still crosses them eventually."""
+
+    def __init__(self, mode=None, period=CLOUD_PERIOD, heartbeat=HEARTBEAT_SEC, deadbands=DEADBANDS):
+        self.mode = mode or UPLINK_POLICY
+        self.period = period
+        self.heartbeat = heartbeat
+        self.deadbands = deadbands
+        self.last_check = time.monotonic()
+        self.last_sent = None
+        self.last_sent_at = 0.0
+        self.counts = {"periodic": 0, "change": 0, "heartbeat": 0, "actuation": 0, "suppressed": 0}
+
+    def due(self, now):
+        return now-self.last_check >= self.period
+
+    def reason(self, pkt, now):
+        """send_reason for a due packet, or None to skip it."""
+        self.last_check = now
+        if self.mode != "deadband":
+            return "periodic"
+        if self.last_sent is None or now-self.last_sent_at >= self.heartbeat:
+            return "heartbeat"
+        last = self.last_sent
+        for f, band in self.deadbands.items():
+            if abs(pkt[f]-last[f]) > band:
+                return "change"
+        self.counts["suppressed"] += 1
+        return None
+
+    def sent(self, pkt, reason, now):
+        pkt["send_reason"] = reason
+        self.counts[reason] += 1
+        self.last_sent = pkt
+        self.last_sent_at = self.last_check = now
+        return pkt
+
+
+def evaluate(buffer, policy):
+    """One decision step. Returns (actuation packet | None, cloud packet | None)."""
+
+    if not buffer.full():
+        return None, None
+
+    agg=aggregate(buffer)
+    health=compute_health(agg)
+    now=time.monotonic()
+
+    # ---- ACTUATION PATH ----
+    if health["actuation"]:
+        cloud=policy.sent(build_cloud_packet(agg,health), "actuation", now)
+        return build_actuation_packet(agg,health), cloud
+
+    # ---- NORMAL TELEMETRY ----
+    if policy.due(now):
+        cloud=build_cloud_packet(agg,health)
+        reason=policy.reason(cloud, now)
+        if reason:
+            return None, policy.sent(cloud, reason, now)
+
+    return None, None
+
+
+def processor(samples, actuations, uplink):
+
+    global POLICY, BAD_SAMPLES
+    buffer=TelemetryBuffer()
+    POLICY=UplinkPolicy()
+    last_log=time.monotonic()
+
+    while True:
+
+        t_sampled, raw = samples.get()
+        try:
+            buffer.push(raw)
+            act, cloud = evaluate(buffer, POLICY)
+        except Exception as e:
+            # skip it: an exception here would end the processor thread and the pipeline with it
+            BAD_SAMPLES += 1
+            if BAD_SAMPLES == 1 or BAD_SAMPLES % 100 == 0:
+                print(f"Bad sample (#{BAD_SAMPLES}):", repr(e))
+            continue
+
+        if act:
+            actuations.put((t_sampled, act))
+            uplink.put(("actuation", act))
+        if cloud:
+            uplink.put(("health", cloud))
+
+        STATS["process"].record(time.monotonic()-t_sampled)
+
+        if time.monotonic()-last_log>=STATS_LOG_SEC:
+            print("Pipeline:", pipeline_stats())
+            last_log=time.monotonic()
+
+
+def worker(jobs, send, stats):
+    while True:
+        t0, pkt = jobs.get()
+        send(pkt)
+        stats.record(time.monotonic()-t0)
+
+
+# ============================================================
+# MAIN LOOP
+# ============================================================
+
+def start_uplink():
+    global OUTBOX
+    OUTBOX=Outbox()
+
+    # set up front so a backlog left by the previous run is replayed right away
+    wake={kind: threading.Event() for kind in uplink_urls()}
+    for event in wake.values():
+        event.set()
+
+    threading.Thread(target=outbox_writer, args=(QUEUES["uplink"], OUTBOX, wake), daemon=True).start()
+    for kind, event in wake.items():
+        threading.Thread(target=uplink_drainer, args=(kind, OUTBOX, event), daemon=True).start()
+
+
+def main_loop():
+
+    samples=QUEUES["samples"]
+    actuations=QUEUES["actuation"]
+    uplink=QUEUES["uplink"]
+
+    # actuation and cloud uplink get their own workers so a slow POST never delays /actuate
+    start_uplink()
+    stages = (
+        (processor, (samples, actuations, uplink)),
+        (worker, (actuations, send_to_esp32, STATS["actuation"])),
+    )
+    for target, args in stages:
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+    sampler(samples)
+
+
+# ============================================================
+# ASYNCIO RUNTIME
+# ============================================================
+
+class AsyncSender:
+    """asyncio counterpart of DropQueue + worker: every put() becomes a request on the IO pool,
+    at most `inflight` running at once. Beyond `maxsize` pending packets new ones are dropped."""
+
+    def __init__(self, send, stats, maxsize, inflight, executor):
+        self.send = send
+        self.stats = stats
+        self.maxsize = maxsize
+        self.slots = asyncio.Semaphore(inflight)
+        self.executor = executor
+        self.pending = set()
+        self.dropped = 0
+
+    def put(self, item):
+        if len(self.pending) >= self.maxsize:
+            self.dropped += 1
+            return
+        task = asyncio.ensure_future(self._send(*item))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _send(self, t0, pkt):
+        async with self.slots:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.send, pkt)
+        self.stats.record(time.monotonic()-t0)
+
+    def qsize(self):
+        return len(self.pending)
+
+
+class Device:
+    """One ESP32 on the asyncio runtime: its own buffer, uplink policy, latency stats and
+    actuation sender. Everything else (IO pool, outbox uplink) is shared."""
+
+    def __init__(self, ip, io):
+        self.ip = ip
+        self.buffer = TelemetryBuffer()
+        self.policy = UplinkPolicy()
+        self.stats = {
+            "sample": StageStats(SAMPLE_PERIOD),
+            "process": StageStats(SAMPLE_PERIOD),
+            "actuation": StageStats(ACTUATION_DEADLINE),
+        }
+        self.actuations = AsyncSender(
+            lambda pkt: send_to_esp32(pkt, ip), self.stats["actuation"],
+            ACTUATION_QUEUE, ACTUATION_INFLIGHT, io
+        )
+        self.bad_samples = 0
+
+    def bad_sample(self, error):
+        # skipped, not fatal: one malformed reading must not stop this device or any other
+        self.bad_samples += 1
+        if self.bad_samples == 1 or self.bad_samples % 100 == 0:
+            print(f"Bad sample from {self.ip} (#{self.bad_samples}):", repr(error))
+
+    @property
+    def key(self):
+        return self.buffer.vehicle_id or self.ip
+
+    def snapshot(self):
+        return {
+            "ip": self.ip,
+            "stages": {k: st.snapshot() for k, st in self.stats.items()},
+            "actuation_queue": {"depth": self.actuations.qsize(), "dropped": self.actuations.dropped},
+            "bad_samples": self.bad_samples,
+            "send_reasons": dict(self.policy.counts)
+        }
+
+
+DEVICES = {}
+
+
+async def device_loop(dev, io, uplink, offset=0.0):
+
+    loop=asyncio.get_running_loop()
+    next_tick=loop.time()+offset
+
+    while True:
+
+        t=time.monotonic()
+        try:
+            raw=await asyncio.wait_for(loop.run_in_executor(io, get_data_from_esp32, dev.ip), ESP32_TIMEOUT)
+        except asyncio.TimeoutError:
+            raw=None
+        now=time.monotonic()
+        dev.stats["sample"].record(now-t)
+
+        if raw:
+            try:
+                dev.buffer.push(raw)
+                act, cloud = evaluate(dev.buffer, dev.policy)
+            except Exception as e:
+                dev.bad_sample(e)
+            else:
+                if act:
+                    dev.actuations.put((now, act))
+                    uplink.put(("actuation", act))
+                if cloud:
+                    uplink.put(("health", cloud))
+                dev.stats["process"].record(time.monotonic()-now)
+
+        # sleep to the next tick deadline; if more than a tick late, drop the missed ticks
+        next_tick+=SAMPLE_PERIOD
+        delay=next_tick-loop.time()
+        if delay<-SAMPLE_PERIOD:
+            next_tick=loop.time()
+        await asyncio.sleep(max(0.0, delay))
+
+
+async def supervise(name, make):
+    """Run the coroutine from make(), restarting it if it raises, so one failing
+    task never takes the rest of the gather() down with it."""
+    while True:
+        try:
+            await make()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"{name} crashed, restarting:", repr(e))
+            await asyncio.sleep(SAMPLE_PERIOD)
+
+
+async def log_stats():
+    while True:
+        await asyncio.sleep(STATS_LOG_SEC)
+        print("Pipeline:", pipeline_stats())
+
+
+async def async_main_loop(devices=None):
+
+    devices=devices or [ESP32_IP]
+
+    # every device can have one poll and ACTUATION_INFLIGHT actuations blocked on a socket at once
+    io=ThreadPoolExecutor(max(IO_WORKERS, len(devices)*(1+ACTUATION_INFLIGHT)), thread_name_prefix="fog-io")
+
+    # the outbox writer and drainers stay on their own threads: SQLite and batched replay don't belong
+    # on the tick loop; one shared outbox batches packets from every device into the same requests
+    QUEUES["uplink"]=DropQueue(UPLINK_QUEUE*len(devices))
+    start_uplink()
+    uplink=QUEUES["uplink"]
+
+    DEVICES.clear()
+    for ip in devices:
+        DEVICES[ip]=Device(ip, io)
+
+    # stagger first ticks across one period so the polls don't all land on the pool at once
+    await asyncio.gather(
+        supervise("stats", log_stats),
+        *(
+            supervise(dev.ip, lambda dev=dev, offset=i*SAMPLE_PERIOD/len(DEVICES): device_loop(dev, io, uplink, offset))
+            for i, dev in enumerate(DEVICES.values())
+        )
+    )
 
 
-def run():
-    threading.Thread(target=main_loop, daemon=True).start()
\ No newline at end of file
+def check_config():
+    """Raise on settings that would otherwise only fail later, inside a daemon thread."""
+    if WIRE_FORMAT not in ("json", "msgpack"):
+        raise ValueError(f"unknown WIRE_FORMAT {WIRE_FORMAT!r}")
+    if WIRE_FORMAT == "msgpack" and msgpack is None:
+        raise RuntimeError("WIRE_FORMAT = 'msgpack' needs the msgpack package (pip install msgpack)")
+
+
+def run(runtime=None):
+    check_config()
+    runtime = runtime or RUNTIME
+    if runtime == "gateway":
+        devices = ESP32_DEVICES or [ESP32_IP]
+        target = lambda: asyncio.run(async_main_loop(devices))
+    elif runtime == "asyncio":
+        target = lambda: asyncio.run(async_main_loop())
+    else:
+        target = main_loop
+    threading.Thread(target=target, daemon=True).start()
@@ -0,0 +1,320 @@
+"""
+Local stand-in for the vehicle ESP32s (and, optionally, the cloud backend).
+
+Every simulated vehicle is its own HTTP server, like a real ESP32:
+    GET  /data       one synthetic sample (JSON, or msgpack if asked for and installed)
+    PUT  /actuate    recorded with its arrival time
+    GET  /sim/stats  poll cadence and actuation latency seen by this vehicle
+
+    python simulator/esp32_sim.py --vehicles 8 --port 9100 --scenarios normal,brake_overheat
+    python simulator/esp32_sim.py --vehicles 8 --port 9100 --cloud-port 9099
+
+With --cloud-port a stub backend takes the fog uplink (/api/intelligence/insert,
+/insert_batch, /api/actuation_events/insert, /insert_batch), validates every packet
+against the backend's payload models (Code/backend, needs pydantic + fastapi) and
+counts what arrives and what would have been rejected.
+"""
+import os
+import sys
+import gzip
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import deque, defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TYPE = "application/msgpack"
+
+# ============================================================
+# SCENARIOS
+# ============================================================
+
+# A scenario edits a healthy sample once the fault has started; `t` is seconds since onset.
+
+def brake_overheat(s, t):
+    # worn pads heating at ~8 C/s: crosses the fog's thermal-protection rule a few seconds in
+    s["brake_temp_c"] = min(300.0, 150.0 + 8.0*t)
+    s["brake_pad_remaining_pct"] = 20.0
+    s["brake_disc_score"] = 0.3
+
+def vibration_spike(s, t):
+    # dominant band far above the rpm-derived expectation, with a strong RMS.
+    # Non-actuating: vibration risk is weighted 0.3 in the emergency score, so with healthy
+    # brakes the score peaks around 0.57 against the 0.85 threshold. The case exercises
+    # the anomaly score and deadband "change" uplinks, not actuation.
+    s["dominant_vibration_hz"] = 250.0
+    s["vibration_rms"] = 1.2 + 0.2*math.sin(t*20)
+
+SCENARIOS = {
+    "normal": None,
+    "brake_overheat": brake_overheat,
+    "vibration_spike": vibration_spike,
+}
+
+
+class Vehicle:
+
+    def __init__(self, index, scenario, fault_at, period):
+        self.vehicle_id = f"SIM-{index:04d}"
+        self.device_id = f"esp32-sim-{index:04d}"
+        self.scenario = scenario
+        self.fault = SCENARIOS[scenario]
+        self.period = period
+        self.start = time.time()
+        self.onset = self.start + fault_at
+        self.lock = threading.Lock()
+        self.last_poll = None
+        self.intervals = deque(maxlen=200000)
+        self.actuations = []
+
+    def sample(self):
+        now = time.time()
+        with self.lock:
+            t = time.monotonic()
+            if self.last_poll is not None:
+                self.intervals.append(t - self.last_poll)
+            self.last_poll = t
+
+        s = {
+            "device_id": self.device_id,
+            "vehicle_id": self.vehicle_id,
+            "timestamp_ms": int(now*1000),
+            "brake_temp_c": 120.0 + random.gauss(0, 0.3),
+            "engine_oil_temp_c": 92.0 + random.gauss(0, 0.2),
+            "motor_rpm": 3000.0 + random.gauss(0, 15),
+            "vibration_rms": 0.3 + random.gauss(0, 0.01),
+            "dominant_vibration_hz": 50.0 + random.gauss(0, 0.3),
+            "battery_voltage_v": 12.6,
+            "output_voltage_v": 13.8,
+            "battery_health_pct": 92,
+            "engine_rul_pct": 75,
+            "brake_rul_pct": 60,
+            "battery_rul_pct": 85,
+            "brake_pad_remaining_pct": 60.0,
+            "brake_disc_score": 0.7,
+        }
+        if self.fault and now >= self.onset:
+            self.fault(s, now - self.onset)
+        return s
+
+    def actuated(self, pkt):
+        recv_ms = time.time()*1000
+        with self.lock:
+            self.actuations.append((recv_ms, pkt.get("timestamp_ms", recv_ms)))
+
+    def stats(self):
+        with self.lock:
+            intervals = sorted(self.intervals)
+            actuations = list(self.actuations)
+
+        jitter = sorted(abs(i - self.period) for i in intervals)
+        latency = sorted(recv - ts for recv, ts in actuations)
+        return {
+            "vehicle_id": self.vehicle_id,
+            "scenario": self.scenario,
+            "polls": len(intervals) + 1 if intervals else 0,
+            "interval_ms": summary(intervals, 1000),
+            "jitter_ms": summary(jitter, 1000),
+            "actuations": len(actuations),
+            # newest sample in the triggering window -> /actuate received
+            "detection_to_actuation_ms": summary(latency),
+            "onset_to_first_actuation_ms":
+                round(actuations[0][0] - self.onset*1000, 1) if actuations and self.fault else None,
+        }
+
+
+def pct(xs, p):
+    return xs[min(len(xs)-1, int(p*len(xs)))] if xs else None
+
+def summary(xs, scale=1):
+    """xs must be sorted."""
+    if not xs:
+        return {}
+    return {
+        "mean": round(sum(xs)/len(xs)*scale, 3),
+        "p50": round(pct(xs, 0.50)*scale, 3),
+        "p99": round(pct(xs, 0.99)*scale, 3),
+        "max": round(xs[-1]*scale, 3),
+    }
+
+
+# ============================================================
+# HTTP
+# ============================================================
+
+class Handler(BaseHTTPRequestHandler):
+    # keep-alive, like the fog's requests.Session expects
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes; with Nagle on, the body then waits for the
+    # client's delayed ACK (~40 ms per request on a kept-alive connection)
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def body(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        if self.headers.get("Content-Type", "").startswith(MSGPACK_TYPE):
+            return msgpack.unpackb(data, strict_map_key=False)
+        return json.loads(data) if data else None
+
+    def reply(self, obj, status=200, content_type="application/json"):
+        data = msgpack.packb(obj) if content_type == MSGPACK_TYPE else json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class VehicleHandler(Handler):
+
+    def do_GET(self):
+        vehicle = self.server.vehicle
+        if self.path == "/data":
+            wants_msgpack = msgpack is not None and MSGPACK_TYPE in self.headers.get("Accept", "")
+            self.reply(vehicle.sample(), content_type=MSGPACK_TYPE if wants_msgpack else "application/json")
+        elif self.path == "/sim/stats":
+            self.reply(vehicle.stats())
+        else:
+            self.reply({"detail": "not found"}, 404)
+
+    def do_PUT(self):
+        if self.path == "/actuate":
+            self.server.vehicle.actuated(self.body())
+            self.reply({"ok": True})
+        else:
+            self.reply({"detail": "not found"}, 404)
+
+
+class CloudHandler(Handler):
+    """Validates what the fog uplink sends like the backend would: 201 if valid, 422 otherwise,
+    and per-item ok / invalid results for /insert_batch. Nothing is stored."""
+
+    def do_POST(self):
+        route = next((r for prefix, r in self.server.routes.items() if self.path.startswith(prefix)), None)
+        if route is None:
+            self.reply({"detail": "not found"}, 404)
+            return
+
+        kind, model = route
+        pkt = self.body()
+        batch = self.path.endswith("/insert_batch")
+        items = pkt if batch else [pkt]
+
+        results = []
+        for i, item in enumerate(items):
+            try:
+                model.model_validate(self.server.from_wire(item, kind))
+                results.append({"index": i, "status": "ok"})
+            except Exception as e:
+                # pydantic ValidationError, or the wire decoder's HTTPException for an unknown schema
+                results.append({"index": i, "status": "invalid", "detail": str(e)[:500]})
+        invalid = sum(r["status"] == "invalid" for r in results)
+
+        cloud = self.server.cloud
+        with cloud["lock"]:
+            cloud["requests"][self.path] += 1
+            cloud["packets"][self.path] += len(items)
+            cloud["invalid"][self.path] += invalid
+            cloud["bytes"][self.path] += int(self.headers.get("Content-Length", 0))
+
+        if batch:
+            self.reply({"inserted": len(items) - invalid, "results": results}, 201)
+        elif invalid:
+            self.reply({"detail": results[0]["detail"]}, 422)
+        else:
+            self.reply({"status": "ok"}, 201)
+
+    def do_GET(self):
+        if self.path == "/sim/stats":
+            cloud = self.server.cloud
+            with cloud["lock"]:
+                self.reply({k: dict(cloud[k]) for k in ("requests", "packets", "invalid", "bytes")})
+        else:
+            self.reply({"detail": "not found"}, 404)
+
+
+def serve(server):
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_vehicles(n, port, scenarios, fault_at, period, host="127.0.0.1"):
+    """Start n vehicle servers on consecutive ports; scenarios are assigned round-robin."""
+    vehicles = []
+    for i in range(n):
+        server = ThreadingHTTPServer((host, port+i), VehicleHandler)
+        server.vehicle = Vehicle(i, scenarios[i % len(scenarios)], fault_at, period)
+        vehicles.append(serve(server))
+    return vehicles
+
+
+def backend_models():
+    """(from_wire, {path prefix: (wire kind, payload model)}) from the backend package in this repo."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+    from app.utils.wire import from_wire
+    from app.models.intelligence import IntelligencePayload
+    from app.models.actuation_event import ActuationEventPayload
+
+    return from_wire, {
+        "/api/intelligence/": ("intelligence", IntelligencePayload),
+        "/api/actuation_events/": ("actuation", ActuationEventPayload),
+    }
+
+
+def start_cloud(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), CloudHandler)
+    server.from_wire, server.routes = backend_models()
+    server.cloud = {
+        "lock": threading.Lock(),
+        "requests": defaultdict(int),
+        "packets": defaultdict(int),
+        "invalid": defaultdict(int),
+        "bytes": defaultdict(int),
+    }
+    return serve(server)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Simulated ESP32 vehicles (and stub backend) for the fog node")
+    p.add_argument("--vehicles", type=int, default=1)
+    p.add_argument("--port", type=int, default=9100, help="first vehicle port; vehicle i listens on port+i")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--scenarios", default="normal", help=f"comma-separated, from: {', '.join(SCENARIOS)}")
+    p.add_argument("--fault-at", type=float, default=5.0, help="seconds after start when faults begin")
+    p.add_argument("--period", type=float, default=0.025, help="expected poll period, for jitter")
+    p.add_argument("--cloud-port", type=int, default=None, help="also run a stub backend on this port")
+    args = p.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    start_vehicles(args.vehicles, args.port, scenarios, args.fault_at, args.period, args.host)
+    if args.cloud_port:
+        start_cloud(args.cloud_port, args.host)
+
+    # the load generator waits for this line
+    print("READY", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+End-to-end fog load test: N simulated ESP32s -> fog_node (gateway runtime) -> backend.
+
+The simulator runs in a child process (its own GIL), the fog node in this one. The
+backend is the simulator's stub unless --backend points at a running API.
+
+    python simulator/loadgen.py --vehicles 20 --duration 30 --scenarios normal,brake_overheat
+    python simulator/loadgen.py --vehicles 5 --backend http://127.0.0.1:8000 --json results.json
+
+Reports, per scenario and overall: poll interval / tick jitter as seen by the ESP32s,
+missed fog deadlines, and detection-to-actuation latency.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+import fog_node as fog
+from esp32_sim import SCENARIOS, summary
+
+
+def start_simulator(args):
+    cmd = [
+        sys.executable, os.path.join(HERE, "esp32_sim.py"),
+        "--vehicles", str(args.vehicles), "--port", str(args.port),
+        "--scenarios", args.scenarios, "--fault-at", str(args.fault_at),
+        "--period", str(fog.SAMPLE_PERIOD),
+    ]
+    if not args.backend:
+        cmd += ["--cloud-port", str(args.cloud_port)]
+
+    sim = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    if sim.stdout.readline().strip() != "READY":
+        sim.kill()
+        sys.exit("simulator failed to start")
+    return sim
+
+
+def configure_fog(args, devices, outbox_path):
+    backend = args.backend or f"http://127.0.0.1:{args.cloud_port}"
+    fog.CLOUD_BATCH_URL = f"{backend}/api/intelligence/insert_batch"
+    fog.ACTUATION_BATCH_URL = f"{backend}/api/actuation_events/insert_batch"
+    fog.ESP32_DEVICES = devices
+    fog.OUTBOX_PATH = outbox_path
+    fog.WIRE_FORMAT = args.wire
+    fog.UPLINK_POLICY = args.policy
+
+
+def collect(devices, args):
+    vehicles = [requests.get(f"http://{d}/sim/stats", timeout=5).json() for d in devices]
+    cloud = None
+    if not args.backend:
+        cloud = requests.get(f"http://127.0.0.1:{args.cloud_port}/sim/stats", timeout=5).json()
+    return vehicles, cloud
+
+
+def report(vehicles, fog_stats, cloud, args):
+    by_scenario = {}
+    for v in vehicles:
+        by_scenario.setdefault(v["scenario"], []).append(v)
+
+    groups = {**by_scenario, "all": vehicles}
+    out = {"config": vars(args), "scenarios": {}, "fog": fog_stats, "cloud": cloud}
+
+    missed = {
+        key: {k: dev["stages"][k]["missed"] for k in ("sample", "process", "actuation")}
+        for key, dev in fog_stats.get("devices", {}).items()
+    }
+
+    print(f"\n{args.vehicles} vehicles, {args.duration:.0f}s, wire={args.wire}, policy={args.policy}\n")
+    print(f"{'scenario':<17}{'veh':>4}{'polls/s':>9}{'jit p50':>9}{'jit p99':>9}{'missed':>8}"
+          f"{'acts':>6}{'det->act p50':>14}{'p99':>8}{'onset->act':>12}")
+
+    for name, group in groups.items():
+        polls = sum(v["polls"] for v in group)
+        jitter = sorted(v["jitter_ms"].get("p50", 0) for v in group)
+        jitter99 = max((v["jitter_ms"].get("p99", 0) for v in group), default=0)
+        acts = sum(v["actuations"] for v in group)
+        det = sorted(v["detection_to_actuation_ms"]["p50"] for v in group if v["actuations"])
+        det99 = max((v["detection_to_actuation_ms"]["p99"] for v in group if v["actuations"]), default=None)
+        onset = sorted(v["onset_to_first_actuation_ms"] for v in group if v["onset_to_first_actuation_ms"] is not None)
+        miss = sum(missed.get(v["vehicle_id"], {}).get("sample", 0) for v in group)
+
+        row = {
+            "vehicles": len(group),
+            "polls_per_sec_per_vehicle": round(polls/len(group)/args.duration, 2),
+            "jitter_p50_ms": summary(jitter).get("p50"),
+            "jitter_p99_ms": jitter99,
+            "missed_sample_deadlines": miss,
+            "actuations": acts,
+            "detection_to_actuation_p50_ms": summary(det).get("p50"),
+            "detection_to_actuation_p99_ms": det99,
+            "onset_to_first_actuation_p50_ms": summary(onset).get("p50"),
+        }
+        out["scenarios"][name] = row
+
+        fmt = lambda x, w: f"{x:>{w}}" if x is not None else f"{'-':>{w}}"
+        print(f"{name:<17}{len(group):>4}{row['polls_per_sec_per_vehicle']:>9}"
+              f"{fmt(row['jitter_p50_ms'], 9)}{fmt(row['jitter_p99_ms'], 9)}{miss:>8}{acts:>6}"
+              f"{fmt(row['detection_to_actuation_p50_ms'], 14)}{fmt(det99, 8)}"
+              f"{fmt(row['onset_to_first_actuation_p50_ms'], 12)}")
+
+    print(f"\nuplink: {fog_stats['stages']['uplink']}, outbox backlog {fog_stats['outbox']}")
+    if cloud:
+        print(f"cloud:  {cloud['packets']}, invalid {cloud['invalid']}")
+
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description="Drive fog_node with simulated ESP32s and report timing")
+    p.add_argument("--vehicles", type=int, default=10)
+    p.add_argument("--duration", type=float, default=20.0)
+    p.add_argument("--scenarios", default="normal,brake_overheat,vibration_spike",
+                   help=f"comma-separated, assigned round-robin, from: {', '.join(SCENARIOS)}")
+    p.add_argument("--fault-at", type=float, default=5.0)
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--cloud-port", type=int, default=9099)
+    p.add_argument("--backend", default=None, help="base URL of a running backend (default: stub)")
+    p.add_argument("--wire", choices=("json", "msgpack"), default=fog.WIRE_FORMAT)
+    p.add_argument("--policy", choices=("periodic", "deadband"), default=fog.UPLINK_POLICY)
+    p.add_argument("--json", default=None, help="also write the results here")
+    args = p.parse_args()
+
+    sim = start_simulator(args)
+    devices = [f"127.0.0.1:{args.port+i}" for i in range(args.vehicles)]
+    outbox = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+
+    try:
+        configure_fog(args, devices, outbox)
+        fog.run("gateway")
+        time.sleep(args.duration)
+
+        fog_stats = fog.pipeline_stats()
+        vehicles, cloud = collect(devices, args)
+    finally:
+        sim.terminate()
+        sim.wait()
+
+    results = report(vehicles, fog_stats, cloud, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    # the fog runtime is daemon threads with no shutdown path; don't let them trip over interpreter teardown
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()